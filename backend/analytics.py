@@ -0,0 +1,434 @@
+import datetime
+import logging
+import os
+from collections import defaultdict
+
+from sqlalchemy import case, delete, func, insert, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from models.domain import UserDB, HealthRecordDB, AnalyticsSummaryDB, AnalyticsDailyDB, UserTrendDailyDB
+
+logger = logging.getLogger(__name__)
+
+# Keep the per-user daily rollup behind /trends up to date on every insert.
+# Off, /trends groups the user's raw health records in the range instead.
+# Run scripts/rebuild_analytics.py after turning it on for an existing database.
+TREND_ROLLUPS = os.getenv("TREND_ROLLUPS", "true").lower() in ("1", "true", "yes")
+
+SUMMARY_ID = 1
+LEVEL_COLUMNS = {"LOW": "low_count", "MEDIUM": "medium_count", "HIGH": "high_count"}
+COUNTER_COLUMNS = ("predictions", "risk_score_sum", "low_count", "medium_count", "high_count")
+
+
+def _empty_counters():
+    return {column: 0 for column in COUNTER_COLUMNS}
+
+
+def _tally(records):
+    # records: iterable of (user_id, timestamp, risk_score, risk_level)
+    total = _empty_counters()
+    daily = defaultdict(_empty_counters)
+    user_daily = {}
+    for user_id, timestamp, risk_score, risk_level in records:
+        day = timestamp.date()
+        trend = user_daily.get((user_id, day))
+        if trend is None:
+            trend = user_daily[(user_id, day)] = {
+                **_empty_counters(), "risk_score_min": risk_score, "risk_score_max": risk_score
+            }
+        else:
+            trend["risk_score_min"] = min(trend["risk_score_min"], risk_score)
+            trend["risk_score_max"] = max(trend["risk_score_max"], risk_score)
+        for counters in (total, daily[day], trend):
+            counters["predictions"] += 1
+            counters["risk_score_sum"] += risk_score
+            if risk_level in LEVEL_COLUMNS:
+                counters[LEVEL_COLUMNS[risk_level]] += 1
+    return total, daily, user_daily
+
+
+async def record_user_created(db: AsyncSession, count: int = 1):
+    await db.execute(
+        update(AnalyticsSummaryDB)
+        .where(AnalyticsSummaryDB.id == SUMMARY_ID)
+        .values(total_users=AnalyticsSummaryDB.total_users + count)
+    )
+
+
+async def record_predictions(db: AsyncSession, records):
+    """Add new predictions to the running totals, inside the caller's transaction.
+
+    If the summary row hasn't been seeded yet the UPDATE matches nothing; the
+    next analytics read rebuilds it from the raw tables.
+    """
+    total, daily, user_daily = _tally(records)
+    if not total["predictions"]:
+        return
+
+    await db.execute(
+        update(AnalyticsSummaryDB)
+        .where(AnalyticsSummaryDB.id == SUMMARY_ID)
+        .values(
+            total_predictions=AnalyticsSummaryDB.total_predictions + total["predictions"],
+            **{column: getattr(AnalyticsSummaryDB, column) + total[column] for column in COUNTER_COLUMNS[1:]}
+        )
+    )
+    for day, counters in daily.items():
+        await _upsert_daily(db, day, counters)
+    if TREND_ROLLUPS:
+        for (user_id, day), counters in user_daily.items():
+            await _upsert_user_day(db, user_id, day, counters)
+
+
+async def _upsert_daily(db: AsyncSession, day, counters):
+    dialect = db.bind.dialect.name
+    if dialect == "mysql":
+        stmt = mysql_insert(AnalyticsDailyDB).values(day=day, **counters)
+        stmt = stmt.on_duplicate_key_update(**{
+            column: getattr(AnalyticsDailyDB, column) + stmt.inserted[column] for column in COUNTER_COLUMNS
+        })
+    elif dialect == "sqlite":
+        stmt = sqlite_insert(AnalyticsDailyDB).values(day=day, **counters)
+        stmt = stmt.on_conflict_do_update(index_elements=["day"], set_={
+            column: getattr(AnalyticsDailyDB, column) + stmt.excluded[column] for column in COUNTER_COLUMNS
+        })
+    else:
+        result = await db.execute(
+            update(AnalyticsDailyDB)
+            .where(AnalyticsDailyDB.day == day)
+            .values(**{column: getattr(AnalyticsDailyDB, column) + counters[column] for column in COUNTER_COLUMNS})
+        )
+        if result.rowcount:
+            return
+        stmt = AnalyticsDailyDB.__table__.insert().values(day=day, **counters)
+    await db.execute(stmt)
+
+
+async def _upsert_user_day(db: AsyncSession, user_id, day, counters):
+    dialect = db.bind.dialect.name
+    if dialect == "mysql":
+        stmt = mysql_insert(UserTrendDailyDB).values(user_id=user_id, day=day, **counters)
+        stmt = stmt.on_duplicate_key_update(
+            risk_score_min=func.least(UserTrendDailyDB.risk_score_min, stmt.inserted.risk_score_min),
+            risk_score_max=func.greatest(UserTrendDailyDB.risk_score_max, stmt.inserted.risk_score_max),
+            **{column: getattr(UserTrendDailyDB, column) + stmt.inserted[column] for column in COUNTER_COLUMNS}
+        )
+    elif dialect == "sqlite":
+        # SQLite's two-argument min() / max() are scalar, like LEAST / GREATEST
+        stmt = sqlite_insert(UserTrendDailyDB).values(user_id=user_id, day=day, **counters)
+        stmt = stmt.on_conflict_do_update(index_elements=["user_id", "day"], set_={
+            "risk_score_min": func.min(UserTrendDailyDB.risk_score_min, stmt.excluded.risk_score_min),
+            "risk_score_max": func.max(UserTrendDailyDB.risk_score_max, stmt.excluded.risk_score_max),
+            **{column: getattr(UserTrendDailyDB, column) + stmt.excluded[column] for column in COUNTER_COLUMNS}
+        })
+    else:
+        low, high = counters["risk_score_min"], counters["risk_score_max"]
+        result = await db.execute(
+            update(UserTrendDailyDB)
+            .where(UserTrendDailyDB.user_id == user_id, UserTrendDailyDB.day == day)
+            .values(
+                risk_score_min=case((UserTrendDailyDB.risk_score_min > low, low), else_=UserTrendDailyDB.risk_score_min),
+                risk_score_max=case((UserTrendDailyDB.risk_score_max < high, high), else_=UserTrendDailyDB.risk_score_max),
+                **{column: getattr(UserTrendDailyDB, column) + counters[column] for column in COUNTER_COLUMNS}
+            )
+        )
+        if result.rowcount:
+            return
+        stmt = UserTrendDailyDB.__table__.insert().values(user_id=user_id, day=day, **counters)
+    await db.execute(stmt)
+
+
+def _as_date(value):
+    # SQLite returns date expressions as ISO strings
+    return datetime.date.fromisoformat(value) if isinstance(value, str) else value
+
+
+async def compute_aggregates(db: AsyncSession):
+    """Aggregates recomputed from users / health_records (full scans)."""
+    total_users = (await db.execute(select(func.count(UserDB.id)))).scalar() or 0
+
+    day_column = func.date(HealthRecordDB.timestamp)
+    rows = await db.execute(
+        select(
+            day_column,
+            HealthRecordDB.risk_level,
+            func.count(HealthRecordDB.id),
+            func.sum(HealthRecordDB.risk_score)
+        ).group_by(day_column, HealthRecordDB.risk_level)
+    )
+
+    total = _empty_counters()
+    daily = defaultdict(_empty_counters)
+    for day, risk_level, count, score_sum in rows:
+        day = _as_date(day)
+        for counters in (total, daily[day]):
+            counters["predictions"] += count
+            counters["risk_score_sum"] += float(score_sum or 0)
+            if risk_level in LEVEL_COLUMNS:
+                counters[LEVEL_COLUMNS[risk_level]] += count
+    return total_users, total, daily
+
+
+async def rebuild_aggregates(db: AsyncSession):
+    """Replace the summary, daily and per-user trend tables with freshly computed values (caller commits).
+
+    Holds the summary row's lock from before the compute until the caller
+    commits, so predictions and sign-ups wait for the rebuild rather than
+    being lost by it.
+    """
+    # Every record_user_created / record_predictions updates the summary row
+    # first. Locking it here means writers that got to it earlier have
+    # committed and are counted below, and later ones wait, then add on top
+    # of the rebuilt values. An UPDATE rather than SELECT ... FOR UPDATE so
+    # it also opens SQLite's write transaction, which ignores FOR UPDATE.
+    seeded = (await db.execute(
+        update(AnalyticsSummaryDB)
+        .where(AnalyticsSummaryDB.id == SUMMARY_ID)
+        .values(updated_at=datetime.datetime.utcnow())
+    )).rowcount
+    total_users, total, daily = await compute_aggregates(db)
+
+    values = {
+        "total_users": total_users,
+        "total_predictions": total["predictions"],
+        **{column: total[column] for column in COUNTER_COLUMNS[1:]}
+    }
+    if seeded:
+        # Updated in place: a waiting writer's UPDATE still finds the row
+        await db.execute(update(AnalyticsSummaryDB).where(AnalyticsSummaryDB.id == SUMMARY_ID).values(**values))
+    else:
+        db.add(AnalyticsSummaryDB(id=SUMMARY_ID, **values))
+    await db.execute(delete(AnalyticsDailyDB))
+    db.add_all([AnalyticsDailyDB(day=day, **counters) for day, counters in daily.items()])
+    await db.flush()
+    await rebuild_user_trends(db)
+    logger.info(f"Rebuilt analytics aggregates: {total_users} users, {total['predictions']} predictions, {len(daily)} days")
+
+
+def _differs(stored, actual):
+    return abs(stored - actual) > 1e-6 * max(1.0, abs(actual))
+
+
+async def check_consistency(db: AsyncSession):
+    """Compare the stored aggregates against the raw tables."""
+    total_users, total, daily = await compute_aggregates(db)
+    summary = await db.get(AnalyticsSummaryDB, SUMMARY_ID)
+    if summary is None:
+        return {"consistent": False, "summary_missing": True, "differences": {}, "mismatched_days": [], "mismatched_user_days": 0}
+
+    expected = {"total_users": total_users, "total_predictions": total["predictions"]}
+    expected.update({column: total[column] for column in COUNTER_COLUMNS[1:]})
+    differences = {
+        field: {"stored": getattr(summary, field), "actual": actual}
+        for field, actual in expected.items() if _differs(getattr(summary, field), actual)
+    }
+
+    stored_daily = {
+        row.day: {column: getattr(row, column) for column in COUNTER_COLUMNS}
+        for row in (await db.execute(select(AnalyticsDailyDB))).scalars()
+    }
+    mismatched_days = sorted(
+        day.isoformat() for day in set(daily) | set(stored_daily)
+        if any(_differs(stored_daily.get(day, _empty_counters())[c], daily.get(day, _empty_counters())[c])
+               for c in COUNTER_COLUMNS)
+    )
+
+    mismatched_user_days = await check_user_trends(db)
+
+    return {
+        "consistent": not differences and not mismatched_days and not mismatched_user_days,
+        "summary_missing": False,
+        "differences": differences,
+        "mismatched_days": mismatched_days,
+        "mismatched_user_days": mismatched_user_days
+    }
+
+
+SUMMARY_FIELDS = ("total_users", "total_predictions") + COUNTER_COLUMNS[1:]
+
+
+async def read_summary(db: AsyncSession):
+    """The summary row's counters, seeding the aggregates on first read.
+
+    The counters change in the same transaction as every user and
+    prediction insert (and on a rebuild), so they also version everything
+    derived from the aggregates.
+    """
+    query = select(*(getattr(AnalyticsSummaryDB, field) for field in SUMMARY_FIELDS)).where(
+        AnalyticsSummaryDB.id == SUMMARY_ID
+    )
+    summary = (await db.execute(query)).first()
+    if summary is None:
+        # First read (or after a reset): seed the aggregates from the raw tables
+        try:
+            await rebuild_aggregates(db)
+            await db.commit()
+        except IntegrityError:
+            # Another request seeded them first
+            await db.rollback()
+        summary = (await db.execute(query)).first()
+    return summary
+
+
+def summarize(summary):
+    distribution = {
+        level: getattr(summary, column) for level, column in LEVEL_COLUMNS.items() if getattr(summary, column)
+    }
+    avg_risk = summary.risk_score_sum / summary.total_predictions if summary.total_predictions else 0
+    return {
+        "total_users": summary.total_users,
+        "total_predictions": summary.total_predictions,
+        "average_risk_score": round(float(avg_risk), 2) if avg_risk else 0,
+        "risk_distribution": distribution
+    }
+
+
+async def read_analytics(db: AsyncSession):
+    return summarize(await read_summary(db))
+
+
+async def read_daily(db: AsyncSession, days: int):
+    since = datetime.datetime.utcnow().date() - datetime.timedelta(days=days - 1)
+    rows = (await db.execute(
+        select(AnalyticsDailyDB).where(AnalyticsDailyDB.day >= since).order_by(AnalyticsDailyDB.day)
+    )).scalars()
+    return [
+        {
+            "day": row.day.isoformat(),
+            "predictions": row.predictions,
+            "average_risk_score": round(row.risk_score_sum / row.predictions, 2) if row.predictions else 0,
+            "risk_distribution": {
+                level: getattr(row, column) for level, column in LEVEL_COLUMNS.items() if getattr(row, column)
+            }
+        }
+        for row in rows
+    ]
+
+
+# Per-user trends: the rollup's columns, in the order the totals below select them
+TREND_COLUMNS = COUNTER_COLUMNS + ("risk_score_min", "risk_score_max")
+TREND_PERIODS = ("day", "week", "month")
+
+
+def _record_totals():
+    # TREND_COLUMNS aggregated over health records
+    score = HealthRecordDB.risk_score
+    return [
+        func.count(HealthRecordDB.id),
+        func.sum(score),
+        *(func.sum(case((HealthRecordDB.risk_level == level, 1), else_=0)) for level in LEVEL_COLUMNS),
+        func.min(score),
+        func.max(score),
+    ]
+
+
+def _rollup_totals():
+    # TREND_COLUMNS aggregated over rollup days
+    return [
+        *(func.sum(getattr(UserTrendDailyDB, column)) for column in COUNTER_COLUMNS),
+        func.min(UserTrendDailyDB.risk_score_min),
+        func.max(UserTrendDailyDB.risk_score_max),
+    ]
+
+
+def _user_days():
+    # (user_id, day, *TREND_COLUMNS) grouped from the raw health records
+    day = func.date(HealthRecordDB.timestamp)
+    return select(HealthRecordDB.user_id, day, *_record_totals()).group_by(HealthRecordDB.user_id, day)
+
+
+async def rebuild_user_trends(db: AsyncSession):
+    """Replace the per-user daily rollup with one grouped from health_records (caller commits)."""
+    await db.execute(delete(UserTrendDailyDB))
+    if TREND_ROLLUPS:
+        await db.execute(insert(UserTrendDailyDB).from_select(("user_id", "day") + TREND_COLUMNS, _user_days()))
+
+
+async def check_user_trends(db: AsyncSession):
+    """Number of (user, day) rollup rows that differ from the raw records."""
+    if not TREND_ROLLUPS:
+        return 0
+    actual = {(row[0], _as_date(row[1])): row[2:] for row in await db.execute(_user_days())}
+    stored = {
+        (row[0], _as_date(row[1])): row[2:]
+        for row in await db.execute(select(
+            UserTrendDailyDB.user_id, UserTrendDailyDB.day,
+            *(getattr(UserTrendDailyDB, column) for column in TREND_COLUMNS)
+        ))
+    }
+    missing = (0,) * len(TREND_COLUMNS)
+    return sum(
+        any(_differs(float(s), float(a)) for s, a in zip(stored.get(key, missing), actual.get(key, missing)))
+        for key in set(actual) | set(stored)
+    )
+
+
+def trend_range_start(period, buckets, today=None):
+    # First day of the oldest of the last `buckets` periods, the current one
+    # included. Weeks start on Monday.
+    today = today or datetime.datetime.utcnow().date()
+    if period == "day":
+        return today - datetime.timedelta(days=buckets - 1)
+    if period == "week":
+        return today - datetime.timedelta(days=today.weekday() + 7 * (buckets - 1))
+    months = today.year * 12 + today.month - 1 - (buckets - 1)
+    return datetime.date(months // 12, months % 12 + 1, 1)
+
+
+def _bucket(dialect, column, period):
+    # First day of the period a date / datetime column falls in
+    if period == "day":
+        return func.date(column)
+    if dialect == "mysql":
+        if period == "week":
+            return func.subdate(func.date(column), func.weekday(column))
+        return func.date(func.date_format(column, "%Y-%m-01"))
+    # SQLite date modifiers
+    if period == "week":
+        return func.date(column, "weekday 0", "-6 days")
+    return func.date(column, "start of month")
+
+
+async def read_trends(db: AsyncSession, user_id, period, buckets):
+    """A user's prediction totals per day, week or month, grouped in the database.
+
+    Summed from the daily rollup when TREND_ROLLUPS is on, so the cost grows
+    with the days in the range rather than the user's records; otherwise
+    grouped from the records in the range over the (user_id, timestamp) index.
+    Periods without predictions are left out.
+    """
+    start = trend_range_start(period, buckets)
+    dialect = db.bind.dialect.name
+    if TREND_ROLLUPS:
+        bucket = _bucket(dialect, UserTrendDailyDB.day, period).label("bucket")
+        query = select(bucket, *_rollup_totals()).where(
+            UserTrendDailyDB.user_id == user_id, UserTrendDailyDB.day >= start
+        )
+    else:
+        bucket = _bucket(dialect, HealthRecordDB.timestamp, period).label("bucket")
+        query = select(bucket, *_record_totals()).where(
+            HealthRecordDB.user_id == user_id,
+            HealthRecordDB.timestamp >= datetime.datetime.combine(start, datetime.time.min)
+        )
+    # Grouped by the label: MySQL treats repeated bound parameters as different expressions
+    rows = await db.execute(query.group_by("bucket").order_by("bucket"))
+
+    trends = []
+    for row in rows:
+        totals = dict(zip(TREND_COLUMNS, row[1:]))
+        predictions = int(totals["predictions"])
+        trends.append({
+            "start": _as_date(row[0]).isoformat(),
+            "predictions": predictions,
+            "average_risk_score": round(float(totals["risk_score_sum"]) / predictions, 2),
+            "min_risk_score": round(float(totals["risk_score_min"]), 2),
+            "max_risk_score": round(float(totals["risk_score_max"]), 2),
+            "risk_distribution": {
+                level: int(totals[column]) for level, column in LEVEL_COLUMNS.items() if totals[column]
+            }
+        })
+    return {"period": period, "start": start.isoformat(), "buckets": trends}
@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from models.domain import UserDB
+
+# How long a verified principal is trusted without re-reading the users
+# table, and how many are kept. 0 disables the cache.
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
+
+class PrincipalCache:
+    """TTL + LRU cache of users resolved from verified tokens.
+
+    Keyed by (user id, token signature), so a new token for the same user is
+    looked up afresh. Invalidation is per process: other workers only drop
+    their entries when the TTL runs out.
+    """
+
+    def __init__(self, ttl=AUTH_CACHE_TTL, max_size=AUTH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, user_id, signature):
+        key = (user_id, signature)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, user_id, signature, principal):
+        with self._lock:
+            self._entries[(user_id, signature)] = (time.monotonic() + self.ttl, dict(principal))
+            self._entries.move_to_end((user_id, signature))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+principal_cache = PrincipalCache()
+
+
+# Any ORM update (e.g. a role change) or delete of a user drops their cached
+# principals once the transaction commits; dropping them at flush would let
+# a request reading the still-committed old row cache it again for the TTL.
+# Bulk update()/delete() statements bypass these hooks and must call
+# principal_cache.invalidate_user themselves.
+_PENDING_KEY = "invalidated_user_ids"
+
+
+@event.listens_for(UserDB, "after_update")
+@event.listens_for(UserDB, "after_delete")
+def _collect_user(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_users(session):
+    for user_id in session.info.pop(_PENDING_KEY, ()):
+        principal_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_users(session):
+    session.info.pop(_PENDING_KEY, None)
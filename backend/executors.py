@@ -0,0 +1,166 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException, status
+
+from metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# Where CPU-bound work runs so it doesn't block the event loop:
+#   process - pre-warmed worker processes (default; fuzzy inference holds the GIL)
+#   thread  - a thread pool (default on Vercel, where worker processes aren't available)
+#   inline  - directly on the event loop, as before
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread" if os.getenv("VERCEL") else "process").lower()
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", str(os.cpu_count() or 1)))
+INFERENCE_MAX_PENDING = int(os.getenv("INFERENCE_MAX_PENDING", "64"))
+
+# Compile the fuzzy engine (and map the lookup table) at startup. Off by
+# default on Vercel so cold starts that only serve /api/health or auth never
+# import NumPy; the first prediction compiles it instead.
+WARM_ENGINE = os.getenv("WARM_ENGINE", "false" if os.getenv("VERCEL") else "true").lower() in ("1", "true", "yes")
+
+# bcrypt releases the GIL while hashing, so plain threads run it in parallel
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "4"))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", "64"))
+
+
+def warm_engine():
+    # Compile the rule base (and map the lookup table) in this process
+    import fuzzy_engine
+    fuzzy_engine.get_engine()
+    if fuzzy_engine.ENGINE_MODE == "lut":
+        from risk_lut import get_lut
+        get_lut()
+
+
+class BoundedExecutor:
+    """Runs blocking calls in a pool, rejecting work beyond a queue-depth limit.
+
+    The pending counter is only touched from the event loop thread, so it
+    needs no lock. Calls beyond max_pending fail fast with a 503 instead of
+    queueing unboundedly behind the pool.
+    """
+
+    def __init__(self, name, kind, workers, max_pending):
+        self.name = name
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self.restarts = 0
+        self._executor = None
+
+    def _create(self):
+        if self.kind == "process":
+            return ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=warm_engine
+            )
+        if self.kind == "thread":
+            return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+        return None
+
+    @property
+    def executor(self):
+        if self._executor is None and self.kind != "inline":
+            self._executor = self._create()
+        return self._executor
+
+    async def start(self):
+        if self.kind == "inline":
+            return
+        # Submit one no-op per worker so processes are spawned (and warmed by
+        # their initializer) before the first request pays for it
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.executor, int) for _ in range(self.workers)])
+        logger.info(f"{self.name} executor ready: {self.workers} {self.kind} workers, max {self.max_pending} pending")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _replace_broken(self, broken):
+        # A worker process died (OOM kill, segfault) and took the pool with
+        # it. Every call in flight sees the same broken pool; the first one
+        # replaces it and the new workers are spawned on the next submit.
+        if self._executor is not broken:
+            return
+        self.restarts += 1
+        logger.error(f"{self.name} executor: a worker process died, restarting the pool")
+        self._executor = self._create()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, fn, *args, **kwargs):
+        if self.kind == "inline":
+            return fn(*args, **kwargs)
+
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            call = functools.partial(fn, *args, **kwargs)
+            # Retried once on a fresh pool; if that breaks too the call
+            # itself is probably what kills the workers
+            for _ in range(2):
+                executor = self.executor
+                try:
+                    return await loop.run_in_executor(executor, call)
+                except BrokenProcessPool:
+                    self._replace_broken(executor)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Inference worker crashed, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        finally:
+            self.pending -= 1
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+        }
+
+
+inference_executor = BoundedExecutor("inference", INFERENCE_EXECUTOR, INFERENCE_WORKERS, INFERENCE_MAX_PENDING)
+bcrypt_executor = BoundedExecutor("bcrypt", "thread", BCRYPT_WORKERS, BCRYPT_MAX_PENDING)
+
+
+async def run_inference(fn, *args, **kwargs):
+    with stage("inference"):
+        return await inference_executor.run(fn, *args, **kwargs)
+
+
+async def run_bcrypt(fn, *args, **kwargs):
+    with stage("password_hash"):
+        return await bcrypt_executor.run(fn, *args, **kwargs)
+
+
+async def start_executors():
+    await inference_executor.start()
+    await bcrypt_executor.start()
+
+
+def shutdown_executors():
+    inference_executor.shutdown()
+    bcrypt_executor.shutdown()
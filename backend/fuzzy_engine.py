@@ -1,94 +1,597 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
 import numpy as np
-import skfuzzy as fuzzy
-from skfuzzy import control as ctrl
-
-def get_health_prediction(bmi_val, hr_val, sleep_val, exercise_val):
-    # Antecedents (Inputs)
-    bmi = ctrl.Antecedent(np.arange(10, 41, 1), 'bmi')
-    heart_rate = ctrl.Antecedent(np.arange(40, 181, 1), 'heart_rate')
-    sleep_hours = ctrl.Antecedent(np.arange(0, 13, 1), 'sleep_hours')
-    exercise_level = ctrl.Antecedent(np.arange(0, 8, 1), 'exercise_level')
-
-    # Consequent (Output)
-    health_risk = ctrl.Consequent(np.arange(0, 101, 1), 'health_risk')
-
-    # BMI Membership Functions
-    bmi['underweight'] = fuzzy.trapmf(bmi.universe, [10, 10, 15, 18])
-    bmi['normal'] = fuzzy.trimf(bmi.universe, [18, 22, 25])
-    bmi['overweight'] = fuzzy.trimf(bmi.universe, [25, 27, 30])
-    bmi['obese'] = fuzzy.trapmf(bmi.universe, [30, 35, 40, 40])
-
-    # Heart Rate Membership Functions
-    heart_rate['low'] = fuzzy.trapmf(heart_rate.universe, [40, 40, 50, 60])
-    heart_rate['normal'] = fuzzy.trimf(heart_rate.universe, [60, 80, 100])
-    heart_rate['high'] = fuzzy.trimf(heart_rate.universe, [100, 120, 140])
-    heart_rate['dangerous'] = fuzzy.trapmf(heart_rate.universe, [140, 160, 180, 180])
-
-    # Sleep Hours Membership Functions
-    sleep_hours['poor'] = fuzzy.trapmf(sleep_hours.universe, [0, 0, 2, 4])
-    sleep_hours['moderate'] = fuzzy.trimf(sleep_hours.universe, [4, 5, 6])
-    sleep_hours['good'] = fuzzy.trimf(sleep_hours.universe, [6, 7, 8])
-    sleep_hours['excellent'] = fuzzy.trapmf(sleep_hours.universe, [8, 10, 12, 12])
-
-    # Exercise Level Membership Functions
-    exercise_level['none'] = fuzzy.trimf(exercise_level.universe, [0, 0, 0.5])
-    exercise_level['low'] = fuzzy.trimf(exercise_level.universe, [0.5, 1.5, 2.5])
-    exercise_level['medium'] = fuzzy.trimf(exercise_level.universe, [2.5, 4, 5.5])
-    exercise_level['high'] = fuzzy.trapmf(exercise_level.universe, [5.5, 6.5, 7, 7])
-
-    # Health Risk Membership Functions
-    health_risk['low'] = fuzzy.trapmf(health_risk.universe, [0, 0, 20, 33])
-    health_risk['medium'] = fuzzy.trimf(health_risk.universe, [33, 50, 66])
-    health_risk['high'] = fuzzy.trapmf(health_risk.universe, [66, 80, 100, 100])
-
-    # Fuzzy Rules (20 rules)
-    rules = [
-        ctrl.Rule(bmi['obese'] & heart_rate['dangerous'] & sleep_hours['poor'], health_risk['high']),
-        ctrl.Rule(bmi['normal'] & heart_rate['normal'] & sleep_hours['good'] & exercise_level['high'], health_risk['low']),
-        ctrl.Rule(bmi['underweight'] & heart_rate['low'] & sleep_hours['poor'], health_risk['medium']),
-        ctrl.Rule(bmi['overweight'] & heart_rate['high'] & exercise_level['none'], health_risk['high']),
-        ctrl.Rule(bmi['obese'] & sleep_hours['poor'], health_risk['high']),
-        ctrl.Rule(heart_rate['dangerous'] | bmi['obese'], health_risk['high']),
-        ctrl.Rule(sleep_hours['excellent'] & exercise_level['high'] & heart_rate['normal'], health_risk['low']),
-        ctrl.Rule(bmi['normal'] & exercise_level['medium'], health_risk['low']),
-        ctrl.Rule(bmi['overweight'] & heart_rate['normal'], health_risk['medium']),
-        ctrl.Rule(sleep_hours['moderate'] & exercise_level['low'], health_risk['medium']),
-        ctrl.Rule(bmi['obese'] & heart_rate['high'], health_risk['high']),
-        ctrl.Rule(heart_rate['normal'] & sleep_hours['good'] & exercise_level['medium'], health_risk['low']),
-        ctrl.Rule(bmi['underweight'] & exercise_level['none'], health_risk['medium']),
-        ctrl.Rule(heart_rate['high'] & sleep_hours['poor'], health_risk['high']),
-        ctrl.Rule(bmi['normal'] & heart_rate['low'] & sleep_hours['excellent'], health_risk['low']),
-        ctrl.Rule(bmi['overweight'] & sleep_hours['moderate'], health_risk['medium']),
-        ctrl.Rule(exercise_level['none'] & sleep_hours['poor'], health_risk['high']),
-        ctrl.Rule(bmi['normal'] & heart_rate['normal'] & sleep_hours['moderate'], health_risk['low']),
-        ctrl.Rule(bmi['obese'] & exercise_level['low'], health_risk['high']),
-        ctrl.Rule(heart_rate['dangerous'] & exercise_level['none'], health_risk['high'])
-    ]
-
-    # Control System
-    risk_ctrl = ctrl.ControlSystem(rules)
-    risk_sim = ctrl.ControlSystemSimulation(risk_ctrl)
-
-    # Inputs
-    risk_sim.input['bmi'] = bmi_val
-    risk_sim.input['heart_rate'] = hr_val
-    risk_sim.input['sleep_hours'] = sleep_val
-    risk_sim.input['exercise_level'] = exercise_val
-
-    # Computation
+
+logger = logging.getLogger(__name__)
+
+# The rule base is data: a versioned JSON document (rules/default.json, or the
+# file FUZZY_RULE_BASE points to) validated and compiled by CompiledFuzzyEngine.
+# Membership functions are given as skfuzzy-style ["trimf", [a, b, c]] /
+# ["trapmf", [a, b, c, d]] breakpoints and universes as np.arange(start, stop,
+# step) arguments, exactly as the original scikit-fuzzy control system
+# declared them. Admins can swap it at runtime, see rule_base_store.py.
+RULE_BASE_PATH = os.getenv(
+    "FUZZY_RULE_BASE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules", "default.json")
+)
+# Documents of activated rule bases by fingerprint, where inference worker
+# processes pick up a rule base swapped in by the process serving requests
+RULE_BASE_CACHE_DIR = os.getenv(
+    "FUZZY_RULE_BASE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "smart_health_rules")
+)
+
+# The API's inputs (HealthInput); every rule base must define exactly these
+INPUT_ORDER = ("bmi", "heart_rate", "sleep_hours", "exercise_level")
+
+MEMBERSHIP_PARAMS = {"trimf": 3, "trapmf": 4}
+# Bounds the sampled universes, so a bad document can't allocate huge tables
+MAX_UNIVERSE_POINTS = 10000
+MAX_VERSION_LENGTH = 64
+
+# Compiled engines kept per process: the active one plus those of recent
+# swaps still referenced by in-flight requests
+ENGINE_KEEP = 4
+
+# Step of the dense output grid used for centroid defuzzification when the
+# output terms have breakpoints between the samples of their universe.
+# Otherwise the sampled terms are the exact trapezoids, and the centroid is
+# integrated from their breakpoints and cut crossings like skfuzzy does
+# (within PARITY_TOLERANCE, see scripts/check_engine_parity.py).
+OUTPUT_RESOLUTION = 0.1
+PARITY_TOLERANCE = 0.01
+
+# "sampled" interpolates input memberships on the integer universes and
+# integrates the output as above, matching scikit-fuzzy.
+# "analytic" evaluates membership functions at the exact input values and
+# integrates the clipped, aggregated output in closed form from its
+# breakpoints (see scripts/compare_inference.py for how far they differ).
+INFERENCE = os.getenv("FUZZY_INFERENCE", "sampled").lower()
+
+# Rows evaluated per vectorized pass, bounds the (rows x output grid) matrix.
+CHUNK_SIZE = 2048
+
+# "exact" evaluates the compiled engine per request, "lut" answers from the
+# precomputed risk surface in risk_lut.py
+ENGINE_MODE = os.getenv("FUZZY_ENGINE_MODE", "exact").lower()
+
+
+class RuleBaseError(ValueError):
+    """A rule base document that can't be compiled."""
+
+
+def load_rule_base(path):
+    with open(path, encoding="utf-8") as f:
+        try:
+            return json.load(f)
+        except ValueError as e:
+            raise RuleBaseError(f"{path}: invalid JSON: {e}")
+
+
+def _number(value, where):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise RuleBaseError(f"{where}: expected a finite number")
+    return value
+
+
+def _universe(value, where):
+    if not isinstance(value, list) or len(value) != 3:
+        raise RuleBaseError(f"{where}: expected [start, stop, step]")
+    start, stop, step = (_number(v, where) for v in value)
+    if step <= 0 or stop <= start:
+        raise RuleBaseError(f"{where}: needs start < stop and step > 0")
+    if not 2 <= math.ceil((stop - start) / step) <= MAX_UNIVERSE_POINTS:
+        raise RuleBaseError(f"{where}: must sample between 2 and {MAX_UNIVERSE_POINTS} points")
+    return (start, stop, step)
+
+
+def _terms(value, where):
+    if not isinstance(value, dict) or not value:
+        raise RuleBaseError(f"{where}: expected a non-empty object of terms")
+    terms = {}
+    for term, spec in value.items():
+        if not (isinstance(spec, list) and len(spec) == 2 and isinstance(spec[0], str)
+                and spec[0] in MEMBERSHIP_PARAMS and isinstance(spec[1], list)):
+            raise RuleBaseError(f'{where}.{term}: expected ["trimf", [a, b, c]] or ["trapmf", [a, b, c, d]]')
+        kind, params = spec
+        if len(params) != MEMBERSHIP_PARAMS[kind]:
+            raise RuleBaseError(f"{where}.{term}: {kind} takes {MEMBERSHIP_PARAMS[kind]} breakpoints")
+        params = [_number(p, f"{where}.{term}") for p in params]
+        if params != sorted(params):
+            raise RuleBaseError(f"{where}.{term}: breakpoints must be non-decreasing")
+        terms[term] = (kind, params)
+    return terms
+
+
+def _variable(value, where):
+    if not isinstance(value, dict):
+        raise RuleBaseError(f"{where}: expected an object with a universe and terms")
+    return {"universe": _universe(value.get("universe"), f"{where}.universe"),
+            "terms": _terms(value.get("terms"), f"{where}.terms")}
+
+
+def parse_rule_base(document):
+    """Validate a rule base document.
+
+    Returns its version and the rule base in the form the engine compiles:
+    {"inputs": {name: variable}, "output": variable, "rules": [(op,
+    [(input, term), ...], output term)]}. Raises RuleBaseError naming the
+    first offending field.
+    """
+    if not isinstance(document, dict):
+        raise RuleBaseError("Rule base must be a JSON object")
+    version = document.get("version")
+    if not isinstance(version, str) or not version.strip() or len(version) > MAX_VERSION_LENGTH:
+        raise RuleBaseError(f"version: expected a non-empty string of at most {MAX_VERSION_LENGTH} characters")
+    if not isinstance(document.get("description", ""), str):
+        raise RuleBaseError("description: expected a string")
+
+    inputs = document.get("inputs")
+    if not isinstance(inputs, dict) or set(inputs) != set(INPUT_ORDER):
+        raise RuleBaseError(f"inputs: must define exactly {', '.join(INPUT_ORDER)}")
+    input_variables = {name: _variable(inputs[name], f"inputs.{name}") for name in INPUT_ORDER}
+
+    output = document.get("output")
+    output_variable = _variable(output, "output")
+    if not isinstance(output.get("name"), str):
+        raise RuleBaseError("output.name: expected a string")
+    output_variable["name"] = output["name"]
+    start, stop, _ = output_variable["universe"]
+    if (stop - start) / OUTPUT_RESOLUTION > MAX_UNIVERSE_POINTS:
+        # Defuzzification samples the output every OUTPUT_RESOLUTION
+        raise RuleBaseError(f"output.universe: spans more than {MAX_UNIVERSE_POINTS * OUTPUT_RESOLUTION:g}")
+
+    rules = document.get("rules")
+    if not isinstance(rules, list) or not rules:
+        raise RuleBaseError("rules: expected a non-empty list")
+    parsed_rules = []
+    for i, rule in enumerate(rules):
+        where = f"rules[{i}]"
+        if not isinstance(rule, dict):
+            raise RuleBaseError(f'{where}: expected an object with "if" and "then"')
+        op = rule.get("op", "and")
+        if op not in ("and", "or"):
+            raise RuleBaseError(f'{where}.op: expected "and" or "or"')
+        antecedents = rule.get("if")
+        if not isinstance(antecedents, list) or not antecedents:
+            raise RuleBaseError(f"{where}.if: expected a non-empty list of [input, term] pairs")
+        for j, pair in enumerate(antecedents):
+            if not (isinstance(pair, list) and len(pair) == 2 and all(isinstance(p, str) for p in pair)
+                    and pair[0] in input_variables and pair[1] in input_variables[pair[0]]["terms"]):
+                raise RuleBaseError(f"{where}.if[{j}]: {json.dumps(pair)} is not an [input, term] pair of this rule base")
+        consequent = rule.get("then")
+        if not isinstance(consequent, str) or consequent not in output_variable["terms"]:
+            raise RuleBaseError(f"{where}.then: expected one of {', '.join(output_variable['terms'])}")
+        parsed_rules.append((op, [tuple(pair) for pair in antecedents], consequent))
+
+    return version, {"inputs": input_variables, "output": output_variable, "rules": parsed_rules}
+
+
+def _membership(x, kind, params):
+    # Same semantics as skfuzzy.trimf / skfuzzy.trapmf, as a trapezoid a-b-c-d
+    if kind == "trimf":
+        a, b, d = params
+        c = b
+    elif kind == "trapmf":
+        a, b, c, d = params
+    else:
+        raise ValueError(f"Unsupported membership function: {kind}")
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.zeros_like(x)
+    if a != b:
+        rising = (a < x) & (x < b)
+        y[rising] = (x[rising] - a) / (b - a)
+    if c != d:
+        falling = (c < x) & (x < d)
+        y[falling] = (d - x[falling]) / (d - c)
+    y[(b <= x) & (x <= c)] = 1.0
+    return y
+
+
+def _trapezoid_params(kind, params):
+    # trimf a-b-c is the trapezoid a-b-b-c
+    return [params[0], params[1], params[1], params[2]] if kind == "trimf" else list(params)
+
+
+def _trapezoid_lines(params):
+    """Rising and falling edges of trapezoids (T x 4) as y = x * slope + intercept.
+
+    Returns (rise_slope, rise_intercept, fall_slope, fall_intercept). A
+    vertical edge (a == b or c == d) becomes the constant 1; membership is
+    min(rising, falling) clipped to [0, 1], and zero outside [a, d].
+    """
+    a, b, c, d = params.T
+    rise = np.divide(1.0, b - a, out=np.zeros_like(a), where=b > a)
+    fall = np.divide(1.0, d - c, out=np.zeros_like(a), where=d > c)
+    return rise, np.where(b > a, -a * rise, 1.0), -fall, np.where(d > c, d * fall, 1.0)
+
+
+def _centroid(x1, dx, y1, y2):
+    # Centroid of piecewise-linear curves, one per row: pieces start at x1,
+    # span dx and run from y1 to y2. NaN where the area is zero.
+    area = (0.5 * dx * (y1 + y2)).sum(axis=1)
+    moment = (dx * (x1 * 0.5 * (y1 + y2) + dx * (y1 + 2.0 * y2) / 6.0)).sum(axis=1)
+    return moment / np.where(area > 0, area, np.nan)
+
+
+class CompiledFuzzyEngine:
+    """Mamdani inference over a rule base compiled into NumPy tables.
+
+    Membership functions are sampled once onto their universes (or kept as
+    breakpoint tables for analytic inference) and the rule base is flattened
+    into index tables, so evaluating N inputs is a handful of array
+    operations instead of a scikit-fuzzy graph traversal per call.
+    """
+
+    def __init__(self, document=None, output_resolution=OUTPUT_RESOLUTION, inference=INFERENCE):
+        if inference not in ("sampled", "analytic"):
+            raise ValueError(f"Unsupported inference mode: {inference}")
+        self.inference = inference
+        if document is None:
+            document = load_rule_base(RULE_BASE_PATH)
+        self.version, self.spec = parse_rule_base(document)
+        self.document = document
+        self.description = document.get("description", "")
+        input_variables, output_variable, rules = self.spec["inputs"], self.spec["output"], self.spec["rules"]
+        self.input_order = INPUT_ORDER
+
+        # Hash of the rule base as compiled, version label included; stored
+        # with it in the rule_bases table
+        self.rule_base_fingerprint = hashlib.sha256(json.dumps({
+            "version": self.version,
+            "inputs": input_variables,
+            "output": output_variable,
+            "rules": rules,
+            "order": self.input_order,
+            "output_resolution": output_resolution,
+        }, sort_keys=True).encode("utf-8")).hexdigest()
+        # Hash of everything that determines the output; keys derived
+        # artifacts such as the lookup table in risk_lut.py and cached
+        # predictions. Set below, once the defuzzification is known.
+        self.fingerprint = self.rule_base_fingerprint
+
+        # Input universes, their sampled membership functions (terms x
+        # universe) and the same functions as trapezoid breakpoints (terms x 4)
+        self.universes = []
+        self.input_mfs = []
+        self.input_params = []
+        self.term_columns = {}
+        column = 0
+        for name in self.input_order:
+            spec = input_variables[name]
+            universe = np.arange(*spec["universe"]).astype(np.float64)
+            self.universes.append(universe)
+            self.input_mfs.append(np.vstack([
+                _membership(universe, kind, params) for kind, params in spec["terms"].values()
+            ]))
+            self.input_params.append(np.array([
+                _trapezoid_params(kind, params) for kind, params in spec["terms"].values()
+            ], dtype=np.float64))
+            for term in spec["terms"]:
+                self.term_columns[(name, term)] = column
+                column += 1
+        self.n_terms = column
+
+        # Analytic fuzzification: every input term's edges as lines over the
+        # column of its input, nonzero on its support within the universe
+        params = np.vstack(self.input_params)
+        self.term_input = np.repeat(np.arange(len(self.input_order)), [len(p) for p in self.input_params])
+        self.term_lines = _trapezoid_lines(params)
+        self.term_low = np.maximum(params[:, 0], [self.universes[i][0] for i in self.term_input])
+        self.term_high = np.minimum(params[:, 3], [self.universes[i][-1] for i in self.term_input])
+
+        # Two constant columns appended to the membership matrix pad the rule
+        # tables: 1.0 is neutral for AND (min), 0.0 is neutral for OR (max).
+        ones_column, zeros_column = column, column + 1
+
+        # Output universe: the coarse skfuzzy universe is linear between its
+        # samples, so resampling it on a dense grid is exact.
+        coarse = np.arange(*output_variable["universe"]).astype(np.float64)
+        n_points = int(round((coarse[-1] - coarse[0]) / output_resolution)) + 1
+        self.output_universe = np.linspace(coarse[0], coarse[-1], n_points)
+        self.output_terms = list(output_variable["terms"])
+        self.output_mfs = np.vstack([
+            np.interp(self.output_universe, coarse, _membership(coarse, kind, params))
+            for kind, params in output_variable["terms"].values()
+        ])
+        self._compile_output_lines(coarse[0], coarse[-1])
+        # With every output breakpoint inside the universe on one of its
+        # samples, the sampled terms are the trapezoids themselves and the
+        # analytic centroid is exact for them too
+        inside = self.output_params[(self.output_params >= coarse[0]) & (self.output_params <= coarse[-1])]
+        self.exact_centroid = bool(np.all(np.abs(inside[:, None] - coarse).min(axis=1) < 1e-9))
+
+        if inference != "sampled":
+            self.fingerprint = hashlib.sha256(f"{self.fingerprint}:{inference}".encode("utf-8")).hexdigest()
+        elif self.exact_centroid:
+            self.fingerprint = hashlib.sha256(f"{self.fingerprint}:exact-centroid".encode("utf-8")).hexdigest()
+
+        # Rule base as (rules x max antecedents) index table + operator mask
+        width = max(len(antecedents) for _, antecedents, _ in rules)
+        self.rule_index = np.empty((len(rules), width), dtype=np.intp)
+        self.rule_is_or = np.zeros(len(rules), dtype=bool)
+        self.rule_consequent = np.empty(len(rules), dtype=np.intp)
+        for r, (op, antecedents, consequent) in enumerate(rules):
+            self.rule_is_or[r] = op == "or"
+            pad = zeros_column if op == "or" else ones_column
+            columns = [self.term_columns[a] for a in antecedents]
+            self.rule_index[r] = columns + [pad] * (width - len(columns))
+            self.rule_consequent[r] = self.output_terms.index(consequent)
+
+        self._curves = None
+
+    def _compile_output_lines(self, low, high):
+        # For analytic defuzzification. Each output term clipped at its cut
+        # level h is made of up to three lines: the rising edge, y = h and
+        # the falling edge. The aggregated output is linear between the
+        # terms' breakpoints and the points where any two of these lines
+        # cross, so those points are all it takes to integrate it exactly.
+        self.output_range = (float(low), float(high))
+        self.output_params = np.array([
+            _trapezoid_params(kind, params) for kind, params in self.spec["output"]["terms"].values()
+        ], dtype=np.float64)
+        self.output_lines = tuple(line[:, None, None] for line in _trapezoid_lines(self.output_params))
+
+        slopes, intercepts, flat = [], [], []
+        for k, (a, b, c, d) in enumerate(self.output_params):
+            if b > a:
+                slopes.append(1.0 / (b - a))
+                intercepts.append(-a / (b - a))
+            if d > c:
+                slopes.append(-1.0 / (d - c))
+                intercepts.append(d / (d - c))
+            # The cut level's line, its intercept filled in per row
+            flat.append(len(slopes))
+            slopes.append(0.0)
+            intercepts.append(0.0)
+        self.line_slopes = np.array(slopes)
+        self.line_intercepts = np.array(intercepts)
+        self.flat_lines = np.array(flat, dtype=np.intp)
+
+        # Parallel lines never cross, leave those pairs out
+        pairs = [(i, j) for i in range(len(slopes)) for j in range(i + 1, len(slopes)) if slopes[i] != slopes[j]]
+        self.pair_i = np.array([i for i, _ in pairs], dtype=np.intp)
+        self.pair_j = np.array([j for _, j in pairs], dtype=np.intp)
+        self.pair_slope_diff = self.line_slopes[self.pair_i] - self.line_slopes[self.pair_j]
+        self.output_breakpoints = np.unique(np.clip(np.append(self.output_params.ravel(), self.output_range), low, high))
+
+    def fuzzify(self, *inputs):
+        """Membership matrix of shape (N, n_terms + 2) for N crisp inputs."""
+        arrays = [np.atleast_1d(np.asarray(v, dtype=np.float64)) for v in inputs]
+        n = len(arrays[0])
+        memberships = np.empty((n, self.n_terms + 2))
+        if self.inference == "analytic":
+            # The membership functions themselves, at the input values, all
+            # terms at once
+            x = np.column_stack(arrays)[:, self.term_input]
+            rise, rise_0, fall, fall_0 = self.term_lines
+            values = np.clip(np.minimum(x * rise + rise_0, x * fall + fall_0), 0.0, 1.0)
+            values[(x < self.term_low) | (x > self.term_high)] = 0.0
+            memberships[:, :self.n_terms] = values
+            memberships[:, -2] = 1.0
+            memberships[:, -1] = 0.0
+            return memberships
+
+        column = 0
+        for x, universe, mfs in zip(arrays, self.universes, self.input_mfs):
+            # Linear interpolation on the sampled universe, zero outside it
+            # (skfuzzy.interp_membership)
+            idx = np.clip(np.searchsorted(universe, x, side="right") - 1, 0, len(universe) - 2)
+            w = (x - universe[idx]) / (universe[idx + 1] - universe[idx])
+            values = mfs[:, idx] * (1.0 - w) + mfs[:, idx + 1] * w
+            values[:, (x < universe[0]) | (x > universe[-1])] = 0.0
+            memberships[:, column:column + len(mfs)] = values.T
+            column += len(mfs)
+        memberships[:, -2] = 1.0
+        memberships[:, -1] = 0.0
+        return memberships
+
+    def rule_strengths(self, memberships):
+        """Firing strength of every rule, shape (N, n_rules)."""
+        gathered = memberships[:, self.rule_index]
+        return np.where(self.rule_is_or, gathered.max(axis=2), gathered.min(axis=2))
+
+    def activations(self, strengths):
+        """Per output term cut level (max over its rules), shape (N, n_output_terms)."""
+        cuts = np.zeros((strengths.shape[0], len(self.output_terms)))
+        for k in range(len(self.output_terms)):
+            mask = self.rule_consequent == k
+            if mask.any():
+                cuts[:, k] = strengths[:, mask].max(axis=1)
+        return cuts
+
+    def defuzzify(self, cuts):
+        """Centroid of the clipped and max-aggregated output, NaN if empty."""
+        if self.inference == "analytic" or self.exact_centroid:
+            return self._defuzzify_analytic(cuts)
+
+        aggregated = np.zeros((cuts.shape[0], len(self.output_universe)))
+        for k in range(len(self.output_terms)):
+            np.maximum(aggregated, np.minimum(cuts[:, k:k + 1], self.output_mfs[k]), out=aggregated)
+
+        # Exact area / first moment of the sampled piecewise-linear curve
+        dx = np.diff(self.output_universe)
+        return _centroid(self.output_universe[:-1], dx, aggregated[:, :-1], aggregated[:, 1:])
+
+    def _aggregated(self, x, cuts):
+        # Clipped and max-aggregated output at x (N x M) for cuts (N x K)
+        rise, rise_0, fall, fall_0 = self.output_lines
+        low, high = self.output_params[:, 0, None, None], self.output_params[:, 3, None, None]
+        clipped = np.minimum(np.minimum(x * rise + rise_0, x * fall + fall_0), cuts.T[:, :, None])
+        clipped *= (x >= low) & (x <= high)
+        return clipped.max(axis=0)
+
+    def _defuzzify_analytic(self, cuts):
+        n = cuts.shape[0]
+        intercepts = np.empty((n, len(self.line_slopes)))
+        intercepts[:] = self.line_intercepts
+        intercepts[:, self.flat_lines] = cuts
+        crossings = (intercepts[:, self.pair_j] - intercepts[:, self.pair_i]) / self.pair_slope_diff
+
+        low, high = self.output_range
+        points = np.empty((n, len(self.output_breakpoints) + crossings.shape[1]))
+        points[:, :len(self.output_breakpoints)] = self.output_breakpoints
+        np.clip(crossings, low, high, out=points[:, len(self.output_breakpoints):])
+        points.sort(axis=1)
+        x1, dx = points[:, :-1], np.diff(points, axis=1)
+
+        # The curve is linear on each piece. Sampling it at the quarter points
+        # recovers the line without ever evaluating on a breakpoint, where a
+        # vertical edge (a == b or c == d) would make the value ambiguous.
+        m = dx.shape[1]
+        quarters = np.empty((n, 2 * m))
+        np.add(x1, 0.25 * dx, out=quarters[:, :m])
+        np.add(x1, 0.75 * dx, out=quarters[:, m:])
+        q = self._aggregated(quarters, cuts)
+        q1, q3 = q[:, :m], q[:, m:]
+        return _centroid(x1, dx, 1.5 * q1 - 0.5 * q3, 1.5 * q3 - 0.5 * q1)
+
+    def explain(self, *inputs):
+        """Every inference step for one crisp input: memberships, rule strengths, cut levels, score."""
+        memberships = self.fuzzify(*inputs)
+        strengths = self.rule_strengths(memberships)
+        cuts = self.activations(strengths)
+        score = float(self.defuzzify(cuts)[0])
+        return {
+            "inputs": {
+                name: {
+                    "value": float(value),
+                    "memberships": {
+                        term: round(float(memberships[0, column]), 4)
+                        for (variable, term), column in self.term_columns.items() if variable == name
+                    },
+                }
+                for name, value in zip(self.input_order, inputs)
+            },
+            "rules": [
+                {"op": op, "if": [list(a) for a in antecedents], "then": consequent, "strength": round(float(s), 4)}
+                for (op, antecedents, consequent), s in zip(self.spec["rules"], strengths[0])
+            ],
+            "output": {term: round(float(cut), 4) for term, cut in zip(self.output_terms, cuts[0])},
+            "score": None if np.isnan(score) else score,
+        }
+
+    def membership_curves(self):
+        """Membership functions as sampled on each universe, i.e. the curves the engine interpolates."""
+        if self._curves is None:
+            output = self.spec["output"]
+            coarse = np.arange(*output["universe"]).astype(np.float64)
+            self._curves = {
+                "inputs": {
+                    name: {
+                        "universe": universe.tolist(),
+                        "terms": dict(zip(self.spec["inputs"][name]["terms"], mfs.round(4).tolist())),
+                    }
+                    for name, universe, mfs in zip(self.input_order, self.universes, self.input_mfs)
+                },
+                "output": {
+                    "name": output["name"],
+                    "universe": coarse.tolist(),
+                    "terms": {
+                        term: _membership(coarse, kind, params).round(4).tolist()
+                        for term, (kind, params) in output["terms"].items()
+                    },
+                },
+            }
+        return self._curves
+
+    def evaluate(self, *inputs):
+        """Crisp risk scores for N inputs; NaN where no rule fires."""
+        arrays = [np.atleast_1d(np.asarray(v, dtype=np.float64)) for v in inputs]
+        n = len(arrays[0])
+        scores = np.empty(n)
+        for start in range(0, n, CHUNK_SIZE):
+            chunk = [a[start:start + CHUNK_SIZE] for a in arrays]
+            cuts = self.activations(self.rule_strengths(self.fuzzify(*chunk)))
+            scores[start:start + CHUNK_SIZE] = self.defuzzify(cuts)
+        return scores
+
+
+_engine = None
+_engines = OrderedDict()
+_engines_lock = threading.Lock()
+
+
+def _remember(engine):
+    with _engines_lock:
+        _engines[engine.fingerprint] = engine
+        _engines.move_to_end(engine.fingerprint)
+        while len(_engines) > ENGINE_KEEP:
+            _engines.popitem(last=False)
+
+
+def get_engine():
+    # The active rule base; compiled from RULE_BASE_PATH on first use
+    global _engine
+    if _engine is None:
+        _engine = CompiledFuzzyEngine()
+        _remember(_engine)
+    return _engine
+
+
+def rule_base_cache_path(fingerprint, cache_dir=RULE_BASE_CACHE_DIR):
+    return os.path.join(cache_dir, f"rule_base_{fingerprint}.json")
+
+
+def install_engine(engine):
+    """Make engine the active one.
+
+    A single reference assignment: requests already scoring with the
+    previous engine finish with it, new ones get this one.
+    """
+    global _engine
+    path = rule_base_cache_path(engine.fingerprint)
     try:
-        risk_sim.compute()
-        risk_score = risk_sim.output['health_risk']
-    except Exception:
-        # Fallback if no fuzzy rules match the specific input combination or gaps exist
-        print(f"Warning: No fuzzy rules matched for inputs (BMI:{bmi_val}, HR:{hr_val}, Sleep:{sleep_val}, Exercise:{exercise_val}). Using fallback.")
-        base = 30
-        if bmi_val > 25: base += 15
-        if hr_val > 100 or hr_val < 60: base += 15
-        if sleep_val < 6: base += 15
-        if exercise_val < 3: base += 15
-        risk_score = float(min(100, base))
-    
+        os.makedirs(RULE_BASE_CACHE_DIR, exist_ok=True)
+        # Write then rename so worker processes never read a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=RULE_BASE_CACHE_DIR, suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(engine.document, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not cache rule base {engine.version} at {path}: {e}")
+    _remember(engine)
+    _engine = engine
+    logger.info(f"Rule base {engine.version} ({engine.fingerprint[:12]}) is now active")
+
+
+def engine_for(fingerprint=None):
+    """Engine of the rule base with this fingerprint; the active one if None.
+
+    Inference worker processes are handed the fingerprint the request was
+    started with and compile that rule base from RULE_BASE_CACHE_DIR the
+    first time they see it, so they follow swaps made in the serving process.
+    """
+    engine = get_engine()
+    if fingerprint is None or fingerprint == engine.fingerprint:
+        return engine
+    with _engines_lock:
+        engine = _engines.get(fingerprint)
+    if engine is None:
+        try:
+            engine = CompiledFuzzyEngine(load_rule_base(rule_base_cache_path(fingerprint)))
+        except FileNotFoundError:
+            raise RuleBaseError(f"Rule base {fingerprint[:12]} is not in {RULE_BASE_CACHE_DIR}")
+        _remember(engine)
+    return engine
+
+
+def fallback_score(bmi_val, hr_val, sleep_val, exercise_val):
+    base = 30
+    if bmi_val > 25: base += 15
+    if hr_val > 100 or hr_val < 60: base += 15
+    if sleep_val < 6: base += 15
+    if exercise_val < 3: base += 15
+    return float(min(100, base))
+
+
+def classify_risk(risk_score):
     if risk_score <= 33:
         risk_level = "LOW"
         recommendation = "You're in good health! Maintain your current lifestyle."
@@ -98,9 +601,67 @@ def get_health_prediction(bmi_val, hr_val, sleep_val, exercise_val):
     else:
         risk_level = "HIGH"
         recommendation = "High risk detected! Please consult a health professional, improve your diet, and exercise regularly."
+    return risk_level, recommendation
+
 
+def build_prediction(risk_score):
+    risk_level, recommendation = classify_risk(risk_score)
     return {
         "risk_score": round(risk_score, 2),
         "risk_level": risk_level,
         "recommendation": recommendation
     }
+
+
+def score_inputs(bmi_vals, hr_vals, sleep_vals, exercise_vals, engine=None):
+    # Raw fuzzy scores for N inputs, NaN where no rule fires
+    engine = engine or get_engine()
+    if ENGINE_MODE == "lut":
+        from risk_lut import get_lut
+        return get_lut(engine).evaluate(bmi_vals, hr_vals, sleep_vals, exercise_vals)
+    return engine.evaluate(bmi_vals, hr_vals, sleep_vals, exercise_vals)
+
+
+def get_health_predictions(bmi_vals, hr_vals, sleep_vals, exercise_vals, rule_base=None):
+    # Vectorized over N inputs: one pass through the compiled engine.
+    # rule_base is the fingerprint of the rule base to score with, see engine_for()
+    engine = engine_for(rule_base)
+    scores = score_inputs(bmi_vals, hr_vals, sleep_vals, exercise_vals, engine)
+
+    predictions = []
+    fallbacks = 0
+    for risk_score, bmi_val, hr_val, sleep_val, exercise_val in zip(
+            scores.tolist(), np.atleast_1d(bmi_vals), np.atleast_1d(hr_vals),
+            np.atleast_1d(sleep_vals), np.atleast_1d(exercise_vals)):
+        if np.isnan(risk_score):
+            # Fallback if no fuzzy rules match the specific input combination or gaps exist
+            if len(scores) == 1:
+                logger.warning(f"No fuzzy rules matched for inputs (BMI:{bmi_val}, HR:{hr_val}, Sleep:{sleep_val}, Exercise:{exercise_val}). Using fallback.")
+            fallbacks += 1
+            risk_score = fallback_score(bmi_val, hr_val, sleep_val, exercise_val)
+        prediction = build_prediction(risk_score)
+        prediction["rule_base_version"] = engine.version
+        predictions.append(prediction)
+    if fallbacks and len(scores) > 1:
+        logger.warning(f"No fuzzy rules matched for {fallbacks} of {len(scores)} inputs. Using fallback.")
+    return predictions
+
+
+def get_health_prediction(bmi_val, hr_val, sleep_val, exercise_val, rule_base=None):
+    return get_health_predictions(bmi_val, hr_val, sleep_val, exercise_val, rule_base=rule_base)[0]
+
+
+def explain_prediction(bmi_val, hr_val, sleep_val, exercise_val, curves=False, rule_base=None):
+    # Always the exact engine: in lut mode the score can differ from
+    # /predict-risk by the table's interpolation error
+    engine = engine_for(rule_base)
+    explanation = engine.explain(bmi_val, hr_val, sleep_val, exercise_val)
+    risk_score = explanation.pop("score")
+    explanation["fallback"] = risk_score is None
+    if risk_score is None:
+        risk_score = fallback_score(bmi_val, hr_val, sleep_val, exercise_val)
+    explanation.update(build_prediction(risk_score))
+    explanation["rule_base_version"] = engine.version
+    if curves:
+        explanation["curves"] = engine.membership_curves()
+    return explanation
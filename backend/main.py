@@ -1,3 +1,6 @@
+import time
+IMPORT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
@@ -6,18 +9,30 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from routes import auth, health, admin
-from database import engine
-from models.domain import Base
+from routes import auth, health, admin, fuzzy, live
+from database import engine, get_db
+from executors import WARM_ENGINE, start_executors, shutdown_executors, warm_engine
+from migrations import AUTO_MIGRATE, migrate
+from record_writer import RECORD_WRITE_MODE, record_writer
+from metrics import (
+    METRICS_ENABLED, METRICS_PUBLIC, METRICS_TOKEN, SamplingProfiler, begin_request, end_request, profile_store, render_metrics,
+    route_label
+)
 
+import hmac
 import logging
+import threading
 import traceback
-from fastapi import Request
-from fastapi.responses import JSONResponse
+from fastapi import Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+
 app = FastAPI(title="Smart Health Risk Prediction System API")
 
 @app.middleware("http")
@@ -35,6 +50,64 @@ async def log_requests(request: Request, call_next):
             content={"detail": str(e), "traceback": traceback.format_exc()}
         )
 
+def profiling_requested(request: Request):
+    # Cheap pre-check on the token's claims; the profile is only kept if the
+    # request then authenticates as an admin
+    if request.headers.get("x-profile") != "1":
+        return False
+    token = request.headers.get("authorization", "").partition(" ")[2]
+    try:
+        return jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM]).get("role") == "admin"
+    except JWTError:
+        return False
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    if not METRICS_ENABLED:
+        return await call_next(request)
+
+    token = begin_request()
+    profiler = None
+    if profiling_requested(request):
+        profiler = SamplingProfiler(threading.get_ident())
+        profiler.start()
+
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        duration = time.perf_counter() - start
+        # Label by route template, not raw path, to keep the series bounded
+        route = route_label(request.scope)
+        state = end_request(token, route, request.method, status_code, duration)
+        stacks = profiler.stop() if profiler else None
+
+    principal = state.get("principal")
+    if stacks is not None and principal and principal.get("role") == "admin":
+        response.headers["X-Profile-Id"] = profile_store.add({
+            "route": route,
+            "method": request.method,
+            "status": status_code,
+            "duration_ms": round(duration * 1000, 3),
+            "samples": profiler.samples,
+            "stages_ms": {name: round(seconds * 1000, 3) for name, seconds in state["stages"].items()},
+            "stacks": stacks,
+        })
+    return response
+
+@app.get("/api/metrics", include_in_schema=False)
+async def metrics(request: Request, db: AsyncSession = Depends(get_db)):
+    if not METRICS_PUBLIC:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+        if not (METRICS_TOKEN and hmac.compare_digest(token, METRICS_TOKEN)):
+            # Otherwise an admin's access token; the session is only used on a principal cache miss
+            await auth.get_current_admin_user(await auth.get_current_user(token, db))
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 @app.get("/api/health")
 async def health_check():
@@ -47,25 +120,50 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "ETag", "X-Next-Cursor", "X-Profile-Id",
+        "X-Rule-Base-Version", "X-Surface-Shape", "X-Surface-X", "X-Surface-Y",
+    ],
 )
 
 # Route Mounting
 app.include_router(auth.router, prefix="/api")
 app.include_router(health.router, prefix="/api")
 app.include_router(admin.router, prefix="/api")
+app.include_router(fuzzy.router, prefix="/api")
+app.include_router(live.router, prefix="/api")
 
 @app.on_event("startup")
 async def startup_event():
-    try:
-        logger.info("Attempting database initialization...")
-        async with engine.begin() as conn:
-            # Create all tables if they don't exist
-            await conn.run_sync(Base.metadata.create_all)
-        logger.info("Database initialized successfully.")
-    except Exception as e:
-        logger.error(f"DATABASE INITIALIZATION FAILED: {e}")
-        logger.error(traceback.format_exc())
-        # We don't reraise so the app can still serve the /health page to report the error
+    started = time.perf_counter()
+    if AUTO_MIGRATE:
+        try:
+            logger.info("Attempting database initialization...")
+            await migrate(engine)
+            logger.info("Database initialized successfully.")
+        except Exception as e:
+            logger.error(f"DATABASE INITIALIZATION FAILED: {e}")
+            logger.error(traceback.format_exc())
+            # We don't reraise so the app can still serve the /health page to report the error
+
+    if WARM_ENGINE:
+        # Compile the rule base (and build or map the risk lookup table)
+        # before the first prediction
+        warm_engine()
+
+    # Spawn and warm the inference / bcrypt workers
+    await start_executors()
+
+    if RECORD_WRITE_MODE == "write_behind":
+        await record_writer.start()
+
+    logger.info(f"Cold start: imports {IMPORT_SECONDS * 1000:.0f} ms, startup {(time.perf_counter() - started) * 1000:.0f} ms")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Flush queued prediction records before the workers go away
+    await record_writer.stop()
+    shutdown_executors()
 
 @app.get("/")
 async def root():
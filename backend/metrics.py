@@ -0,0 +1,281 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+from fastapi.routing import APIRoute
+
+# Per-request stage timings and request counts, exported in Prometheus text
+# format at /api/metrics. "false" turns the middleware and all stage timers
+# into no-ops.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() not in ("0", "false", "no")
+# /api/metrics is readable with "Authorization: Bearer <METRICS_TOKEN>" (for a
+# scraper) or an admin's access token. "true" serves it to anyone; only for
+# deployments where the endpoint isn't reachable from outside.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "false").lower() in ("1", "true", "yes")
+
+# Sampling profiler for single requests (admins only, X-Profile: 1 header)
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.002"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_text(names, values):
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{{{_label_text(self.labels, label_values)}}} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total) in sorted(self._series.items()):
+                labels = _label_text(self.labels, label_values)
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{self.name}_sum{{{labels}}} {total:.6f}")
+                lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+requests_total = Counter(
+    "smart_health_requests_total", "HTTP requests by route, method and status", ("route", "method", "status")
+)
+request_duration = Histogram(
+    "smart_health_request_duration_seconds", "Time to produce the response", ("route", "method")
+)
+stage_duration = Histogram(
+    "smart_health_stage_duration_seconds",
+    "Time spent per request in each stage (auth, db, commit, inference, password_hash, serialization)",
+    ("route", "stage")
+)
+
+
+def route_label(scope):
+    """Route template of a handled request, e.g. /api/history; "unmatched" for 404s."""
+    route = scope.get("route")
+    template = getattr(route, "path_format", None)
+    if template is None:
+        return "unmatched"
+    # Depending on the FastAPI version the matched route may or may not carry
+    # the router's include prefix; recover it from the concrete path
+    try:
+        concrete = template.format(**scope.get("path_params", {}))
+    except (KeyError, IndexError, ValueError):
+        return template
+    path = scope.get("path", "")
+    if concrete and path.endswith(concrete):
+        return path[:len(path) - len(concrete)] + template
+    return template
+
+
+def render_metrics():
+    lines = []
+    for metric in (requests_total, request_duration, stage_duration):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Timings of the request being handled. Shared (by reference) with the tasks
+# and threadpool calls a request spawns, since they copy the context.
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+def begin_request():
+    return _current.set({"stages": defaultdict(float)})
+
+
+def end_request(token, route, method, status, duration):
+    state = _current.get()
+    _current.reset(token)
+    requests_total.inc((route, method, str(status)))
+    request_duration.observe((route, method), duration)
+    for name, seconds in state["stages"].items():
+        stage_duration.observe((route, name), seconds)
+    return state
+
+
+def current_request():
+    return _current.get()
+
+
+@contextmanager
+def stage(name):
+    """Add the time spent in the block to the current request's `name` stage."""
+    state = _current.get()
+    if state is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        state["stages"][name] += time.perf_counter() - start
+
+
+def _mark_endpoint_done():
+    state = _current.get()
+    if state is not None:
+        state["endpoint_done"] = time.perf_counter()
+
+
+def _wrap_endpoint(endpoint):
+    # FastAPI reads the endpoint's signature through functools.wraps'
+    # __wrapped__, so dependencies and parameters are unaffected
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _mark_endpoint_done()
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                _mark_endpoint_done()
+    return wrapper
+
+
+class TimedRoute(APIRoute):
+    """Route that times response serialization.
+
+    Serialization is everything between the endpoint returning and the route
+    handing its response back: response_model validation and JSON encoding.
+    """
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, _wrap_endpoint(endpoint) if METRICS_ENABLED else endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            response = await handler(request)
+            state = _current.get()
+            if state is not None and "endpoint_done" in state:
+                state["stages"]["serialization"] += time.perf_counter() - state.pop("endpoint_done")
+            return response
+
+        return timed_handler
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval.
+
+    Profiles the event loop thread, so requests running concurrently show
+    up too, and inference in worker processes is only seen as the wait for
+    its result. Output is in collapsed-stack format (one "frame;frame;... N"
+    line per stack), readable by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self._stacks = defaultdict(int)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return "".join(f"{stack} {count}\n" for stack, count in
+                       sorted(self._stacks.items(), key=lambda item: -item[1]))
+
+
+class ProfileStore:
+    """The last PROFILE_KEEP request profiles, by id."""
+
+    def __init__(self, keep=PROFILE_KEEP):
+        self.keep = keep
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile):
+        profile_id = uuid.uuid4().hex
+        with self._lock:
+            self._profiles[profile_id] = profile
+            while len(self._profiles) > self.keep:
+                self._profiles.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self):
+        with self._lock:
+            return [
+                {"id": profile_id, **{k: v for k, v in profile.items() if k != "stacks"}}
+                for profile_id, profile in reversed(self._profiles.items())
+            ]
+
+
+profile_store = ProfileStore()
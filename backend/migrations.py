@@ -0,0 +1,50 @@
+import logging
+import os
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
+from models.domain import Base
+
+logger = logging.getLogger(__name__)
+
+# Create missing tables and indexes when the app starts. Off by default on
+# Vercel, where it would cost a round of DDL checks against the remote
+# database on every cold start; run scripts/migrate.py when deploying instead.
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "false" if os.getenv("VERCEL") else "true").lower() in ("1", "true", "yes")
+
+
+def _add_missing_columns(sync_conn):
+    # create_all skips existing tables, so add columns introduced since.
+    # Only nullable ones can be added to a table that already has rows.
+    inspector = inspect(sync_conn)
+    preparer = sync_conn.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable:
+                logger.error(f"Column {table.name}.{column.name} is missing and NOT NULL, add it by hand")
+                continue
+            definition = CreateColumn(column).compile(dialect=sync_conn.dialect)
+            sync_conn.execute(text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {definition}"))
+            logger.info(f"Added column {table.name}.{column.name}")
+
+
+def _create_schema(sync_conn):
+    _add_missing_columns(sync_conn)
+    # Create all tables if they don't exist
+    Base.metadata.create_all(sync_conn)
+    # create_all skips existing tables, so add indexes introduced since
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
+async def migrate(engine):
+    async with engine.begin() as conn:
+        await conn.run_sync(_create_schema)
+    logger.info("Database schema is up to date.")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, ForeignKey, DateTime
+from sqlalchemy import Column, String, Integer, Float, Boolean, Text, ForeignKey, DateTime, Date, Index
 from sqlalchemy.orm import declarative_base, relationship
 import datetime
 import uuid
@@ -21,6 +21,15 @@ class UserDB(Base):
     
     records = relationship("HealthRecordDB", back_populates="user", cascade="all, delete-orphan")
 
+class FirstAdminDB(Base):
+    # At most one row (id=1), inserted with the first registered user, who
+    # becomes the admin; concurrent first sign-ups race on the primary key
+    __tablename__ = "first_admin"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String(36), nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
 class HealthRecordDB(Base):
     __tablename__ = "health_records"
     
@@ -34,5 +43,96 @@ class HealthRecordDB(Base):
     risk_level = Column(String(50), nullable=False)
     recommendation = Column(String(1000), nullable=False)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    # Version of the rule base that scored the record; NULL for records from
+    # before rule bases were versioned
+    rule_base_version = Column(String(64), nullable=True)
     
     user = relationship("UserDB", back_populates="records")
+
+    __table_args__ = (
+        # Serves per-user history pages ordered by time
+        Index("ix_health_records_user_id_timestamp", "user_id", "timestamp"),
+    )
+
+class AnalyticsSummaryDB(Base):
+    # Single row (id=1) of running totals, updated in the same transaction as
+    # every user / prediction insert
+    __tablename__ = "analytics_summary"
+    
+    id = Column(Integer, primary_key=True)
+    total_users = Column(Integer, default=0, nullable=False)
+    total_predictions = Column(Integer, default=0, nullable=False)
+    risk_score_sum = Column(Float, default=0.0, nullable=False)
+    low_count = Column(Integer, default=0, nullable=False)
+    medium_count = Column(Integer, default=0, nullable=False)
+    high_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, nullable=False)
+
+class AnalyticsDailyDB(Base):
+    # Per-day (UTC) prediction totals
+    __tablename__ = "analytics_daily"
+    
+    day = Column(Date, primary_key=True)
+    predictions = Column(Integer, default=0, nullable=False)
+    risk_score_sum = Column(Float, default=0.0, nullable=False)
+    low_count = Column(Integer, default=0, nullable=False)
+    medium_count = Column(Integer, default=0, nullable=False)
+    high_count = Column(Integer, default=0, nullable=False)
+
+class UserTrendDailyDB(Base):
+    # Per-user, per-day (UTC) prediction totals behind /trends; weeks and
+    # months are summed from these rows
+    __tablename__ = "user_trends_daily"
+
+    user_id = Column(String(36), primary_key=True)
+    day = Column(Date, primary_key=True)
+    predictions = Column(Integer, default=0, nullable=False)
+    risk_score_sum = Column(Float, default=0.0, nullable=False)
+    risk_score_min = Column(Float, nullable=False)
+    risk_score_max = Column(Float, nullable=False)
+    low_count = Column(Integer, default=0, nullable=False)
+    medium_count = Column(Integer, default=0, nullable=False)
+    high_count = Column(Integer, default=0, nullable=False)
+
+class ImportJobDB(Base):
+    # Progress of a bulk import; rows_processed is advanced in the same
+    # transaction as each chunk's inserts, so a job resumes exactly after
+    # its last committed chunk
+    __tablename__ = "import_jobs"
+    
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    source = Column(String(255), nullable=False)
+    default_user_id = Column(String(36), nullable=True)
+    status = Column(String(50), default="running", nullable=False)
+    rows_processed = Column(Integer, default=0, nullable=False)
+    rows_imported = Column(Integer, default=0, nullable=False)
+    rows_rejected = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, nullable=False)
+
+class ImportRejectDB(Base):
+    # Rows an import rejected, kept for download and re-import; added in the
+    # same transaction as the chunk they came from
+    __tablename__ = "import_rejects"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(String(36), nullable=False, index=True)
+    line = Column(Integer, nullable=False)
+    # JSON; NULL when the line wasn't valid JSON
+    row = Column(Text, nullable=True)
+    errors = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+class RuleBaseDB(Base):
+    # Rule base documents activated through the admin API. The row flagged
+    # active is the rule base every app process serves (rule_base_store.py);
+    # with none, processes use the bundled rules/default.json
+    __tablename__ = "rule_bases"
+    
+    version = Column(String(64), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    document = Column(Text, nullable=False)
+    active = Column(Boolean, default=False, nullable=False)
+    created_by = Column(String(36), nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    activated_at = Column(DateTime, nullable=True)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, ConfigDict
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List, Any
 
 class HealthInput(BaseModel):
     bmi: float = Field(..., ge=10, le=40)
@@ -8,10 +8,16 @@ class HealthInput(BaseModel):
     sleep_hours: float = Field(..., ge=0, le=12)
     exercise_level: float = Field(..., ge=0, le=7)
 
+class HealthImportRow(HealthInput):
+    # One row of a bulk import file; user_id may come from the import's default
+    user_id: Optional[str] = None
+    timestamp: Optional[datetime] = None
+
 class PredictionResult(BaseModel):
     risk_score: float
     risk_level: str
     recommendation: str
+    rule_base_version: Optional[str] = None
 
 class HealthRecord(HealthInput, PredictionResult):
     id: Optional[str] = None
@@ -19,3 +25,18 @@ class HealthRecord(HealthInput, PredictionResult):
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
     model_config = ConfigDict(from_attributes=True)
+
+class BatchItemError(BaseModel):
+    loc: List[Any]
+    msg: str
+    type: str
+
+class BatchItemResult(BaseModel):
+    index: int
+    result: Optional[PredictionResult] = None
+    errors: Optional[List[BatchItemError]] = None
+
+class BatchPredictionResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BatchItemResult]
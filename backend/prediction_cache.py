@@ -0,0 +1,113 @@
+import os
+import threading
+from collections import OrderedDict
+
+from executors import run_inference
+
+# Max cached predictions (0 disables the cache) and the step inputs are
+# rounded to before lookup; 0.01 keeps every value the sliders can send distinct.
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_PRECISION = float(os.getenv("PREDICTION_CACHE_PRECISION", "0.01"))
+# Max cached risk surfaces (/api/fuzzy/surface). One at the largest
+# resolution is ~40 KB.
+SURFACE_CACHE_SIZE = int(os.getenv("SURFACE_CACHE_SIZE", "128"))
+
+
+class PredictionCache:
+    """Bounded LRU of predictions keyed on quantized inputs.
+
+    Keys include the fingerprint of the rule base that produced the entry,
+    so requests still on the old rule base during a swap and those on the
+    new one share the cache without clearing each other's entries; the old
+    rule base's entries are evicted as they go cold.
+    """
+
+    def __init__(self, max_size=PREDICTION_CACHE_SIZE, precision=PREDICTION_CACHE_PRECISION):
+        self.max_size = max_size
+        self.precision = precision
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def quantize(self, *inputs):
+        steps = tuple(int(round(value / self.precision)) for value in inputs)
+        return steps, tuple(round(step * self.precision, 10) for step in steps)
+
+    def get(self, fingerprint, key):
+        with self._lock:
+            value = self._entries.get((fingerprint, key))
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((fingerprint, key))
+            self.hits += 1
+            return dict(value)
+
+    def put(self, fingerprint, key, value):
+        with self._lock:
+            self._entries[(fingerprint, key)] = dict(value)
+            self._entries.move_to_end((fingerprint, key))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "precision": self.precision,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+prediction_cache = PredictionCache()
+# Same LRU, keyed on (axes, resolution, quantized fixed inputs)
+surface_cache = PredictionCache(max_size=SURFACE_CACHE_SIZE)
+
+
+async def get_cached_prediction(bmi_val, hr_val, sleep_val, exercise_val):
+    # Imported on first use so NumPy stays off the cold start path
+    from fuzzy_engine import get_engine, get_health_prediction
+
+    # Pinned here so the worker scores with the rule base this request started on
+    fingerprint = get_engine().fingerprint
+    if prediction_cache.max_size <= 0:
+        return await run_inference(
+            get_health_prediction, bmi_val, hr_val, sleep_val, exercise_val, rule_base=fingerprint
+        )
+
+    key, quantized = prediction_cache.quantize(bmi_val, hr_val, sleep_val, exercise_val)
+    prediction = prediction_cache.get(fingerprint, key)
+    if prediction is None:
+        # Score the quantized inputs so every hit on this key gets the same answer
+        prediction = await run_inference(get_health_prediction, *quantized, rule_base=fingerprint)
+        prediction_cache.put(fingerprint, key, prediction)
+    return prediction
+
+
+async def get_cached_surface(x_input, y_input, fixed, resolution):
+    from fuzzy_engine import get_engine
+    from risk_surface import compute_surface
+
+    fingerprint = get_engine().fingerprint
+    names = sorted(fixed)
+    steps, quantized = surface_cache.quantize(*(fixed[name] for name in names))
+    key = (x_input, y_input, resolution, tuple(zip(names, steps)))
+    surface = surface_cache.get(fingerprint, key)
+    if surface is None:
+        surface = await run_inference(
+            compute_surface, x_input, y_input, dict(zip(names, quantized)), resolution, rule_base=fingerprint
+        )
+        surface_cache.put(fingerprint, key, surface)
+    return surface
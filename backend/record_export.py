@@ -0,0 +1,187 @@
+import csv
+import datetime
+import io
+import json
+import logging
+import os
+import time
+
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal
+from models.domain import HealthRecordDB
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the server-side cursor per round trip; peak memory per
+# export is one batch (one row group for Parquet) whatever the table size
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_ROW_GROUP_SIZE = int(os.getenv("EXPORT_ROW_GROUP_SIZE", "10000"))
+
+EXPORT_COLUMNS = (
+    HealthRecordDB.id,
+    HealthRecordDB.user_id,
+    HealthRecordDB.bmi,
+    HealthRecordDB.heart_rate,
+    HealthRecordDB.sleep_hours,
+    HealthRecordDB.exercise_level,
+    HealthRecordDB.risk_score,
+    HealthRecordDB.risk_level,
+    HealthRecordDB.recommendation,
+    HealthRecordDB.rule_base_version,
+    HealthRecordDB.timestamp,
+)
+FIELD_NAMES = [column.key for column in EXPORT_COLUMNS]
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _naive_utc(value):
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def export_query(user_id=None, start=None, end=None):
+    """Records in [start, end) oldest first, optionally for a single user."""
+    query = select(*EXPORT_COLUMNS)
+    if user_id is not None:
+        query = query.where(HealthRecordDB.user_id == user_id)
+    start, end = _naive_utc(start), _naive_utc(end)
+    if start is not None:
+        query = query.where(HealthRecordDB.timestamp >= start)
+    if end is not None:
+        query = query.where(HealthRecordDB.timestamp < end)
+    return query.order_by(HealthRecordDB.timestamp, HealthRecordDB.id)
+
+
+def export_filename(fmt, user_id=None):
+    scope = f"user-{user_id}" if user_id else "all"
+    stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    return f"health-records-{scope}-{stamp}.{fmt}"
+
+
+async def iter_batches(query, batch_size=EXPORT_BATCH_SIZE):
+    """Yield lists of row tuples from a server-side cursor.
+
+    The export opens its own session: the response body is produced after
+    the endpoint has returned, so it can't borrow the request's session.
+    """
+    start = time.perf_counter()
+    count = 0
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=batch_size))
+        async for partition in result.partitions():
+            count += len(partition)
+            yield partition
+    logger.info(f"Exported {count} health records in {time.perf_counter() - start:.2f}s")
+
+
+async def stream_csv(query):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELD_NAMES)
+    async for rows in iter_batches(query):
+        for row in rows:
+            writer.writerow(value.isoformat() if isinstance(value, datetime.datetime) else value for value in row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def stream_ndjson(query):
+    async for rows in iter_batches(query):
+        yield "".join(
+            json.dumps({
+                name: value.isoformat() if isinstance(value, datetime.datetime) else value
+                for name, value in zip(FIELD_NAMES, row)
+            }) + "\n"
+            for row in rows
+        )
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("id", pa.string()),
+        ("user_id", pa.string()),
+        ("bmi", pa.float64()),
+        ("heart_rate", pa.float64()),
+        ("sleep_hours", pa.float64()),
+        ("exercise_level", pa.float64()),
+        ("risk_score", pa.float64()),
+        ("risk_level", pa.string()),
+        ("recommendation", pa.string()),
+        ("rule_base_version", pa.string()),
+        ("timestamp", pa.timestamp("us")),
+    ])
+
+
+async def stream_parquet(query, row_group_size=EXPORT_ROW_GROUP_SIZE):
+    """Write one Parquet row group per row_group_size records and stream each as it's done."""
+    # pyarrow is only needed here, keep it off the import path of every request
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    pending = []
+
+    def write_row_group(rows):
+        columns = list(zip(*rows))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema
+        ), row_group_size=len(rows))
+
+    try:
+        async for rows in iter_batches(query):
+            pending.extend(rows)
+            while len(pending) >= row_group_size:
+                write_row_group(pending[:row_group_size])
+                pending = pending[row_group_size:]
+                yield sink.drain()
+        if pending:
+            write_row_group(pending)
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+STREAMERS = {
+    "csv": stream_csv,
+    "ndjson": stream_ndjson,
+    "parquet": stream_parquet,
+}
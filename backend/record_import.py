@@ -0,0 +1,265 @@
+import asyncio
+import csv
+import datetime
+import itertools
+import json
+import logging
+import os
+import time
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal
+from models.domain import UserDB, HealthRecordDB, ImportJobDB, ImportRejectDB
+from models.health_record import HealthImportRow
+from executors import run_inference
+from analytics import record_predictions
+from rule_base_store import sync_rule_base
+
+logger = logging.getLogger(__name__)
+
+# Rows validated, scored and committed together; bounds memory per import
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+# Rejected rows echoed back in an import report (all are counted)
+IMPORT_MAX_REPORTED_ERRORS = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", "100"))
+
+FORMATS = ("csv", "ndjson")
+
+
+class RecordImportError(Exception):
+    pass
+
+
+def detect_format(filename, fmt=None):
+    if fmt:
+        fmt = fmt.lower()
+    elif filename.lower().endswith(".csv"):
+        fmt = "csv"
+    elif filename.lower().endswith((".ndjson", ".jsonl")):
+        fmt = "ndjson"
+    if fmt not in FORMATS:
+        raise RecordImportError(f"Unsupported import format, expected one of {', '.join(FORMATS)}")
+    return fmt
+
+
+def iter_rows(text_stream, fmt):
+    """Yield (line number, row dict or parse error) one row at a time."""
+    if fmt == "csv":
+        reader = csv.DictReader(text_stream)
+        for row in reader:
+            # Empty CSV cells mean "not given"
+            yield reader.line_num, {k: (v if v != "" else None) for k, v in row.items() if k}
+    else:
+        for line_num, line in enumerate(text_stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_num, e
+                continue
+            yield line_num, row
+
+
+def _validate(line_num, row, default_user_id):
+    if isinstance(row, Exception):
+        return None, {"line": line_num, "errors": [{"loc": [], "msg": f"Invalid JSON: {row}", "type": "json_invalid"}]}
+    try:
+        parsed = HealthImportRow.model_validate(row)
+    except ValidationError as e:
+        return None, {
+            "line": line_num,
+            "errors": [{"loc": list(err["loc"]), "msg": err["msg"], "type": err["type"]} for err in e.errors()]
+        }
+    if parsed.user_id is None:
+        parsed.user_id = default_user_id
+    if parsed.user_id is None:
+        return None, {"line": line_num, "errors": [{"loc": ["user_id"], "msg": "Field required", "type": "missing"}]}
+    if parsed.timestamp is not None and parsed.timestamp.tzinfo is not None:
+        parsed.timestamp = parsed.timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed, None
+
+
+async def _get_job(db: AsyncSession, source, job_id, default_user_id):
+    if job_id is None:
+        job = ImportJobDB(source=source, default_user_id=default_user_id)
+        db.add(job)
+        await db.commit()
+        return job
+
+    job = await db.get(ImportJobDB, job_id)
+    if job is None:
+        raise RecordImportError(f"Import job {job_id} not found")
+    if job.source != source:
+        raise RecordImportError(f"Import job {job_id} was started from '{job.source}', not '{source}'")
+    if default_user_id is not None and default_user_id != job.default_user_id:
+        # One import, one owner for rows without a user_id
+        owner = f"for user '{job.default_user_id}'" if job.default_user_id else "without a user_id"
+        raise RecordImportError(f"Import job {job_id} was started {owner}, not for '{default_user_id}'")
+    if job.status == "completed":
+        raise RecordImportError(f"Import job {job_id} is already completed")
+    job.status = "running"
+    await db.commit()
+    return job
+
+
+async def import_records(db: AsyncSession, rows, source, job_id=None, default_user_id=None,
+                         on_invalid="quarantine", quarantine=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """Stream rows into health_records chunk by chunk.
+
+    rows is an iterator from iter_rows(). Each chunk is validated against
+    the HealthInput bounds, scored in one vectorized engine call and
+    inserted in one transaction together with the job's progress. Passing
+    the job_id of an interrupted import skips the rows it already committed;
+    default_user_id must then be omitted or match the one the job started with.
+    With on_invalid="quarantine" every rejected row is also handed to the
+    quarantine callable (e.g. written to a reject file) or, without one,
+    stored in import_rejects for iter_rejects(). Rows are read in a worker
+    thread, so a large file doesn't block the event loop.
+    """
+    job = await _get_job(db, source, job_id, default_user_id)
+    rows = itertools.islice(rows, job.rows_processed, None)
+    # A resumed job keeps the owner it was started with
+    default_user_id = job.default_user_id
+
+    try:
+        return await _import_chunks(db, job, rows, default_user_id, on_invalid, quarantine, chunk_size)
+    except Exception:
+        # Leave the job resumable from its last committed chunk
+        await db.rollback()
+        job.status = "failed"
+        await db.commit()
+        raise
+
+
+async def _import_chunks(db, job, rows, default_user_id, on_invalid, quarantine, chunk_size):
+    from fuzzy_engine import get_engine, get_health_predictions
+
+    errors = []
+    imported = rejected = processed = 0
+    start = time.perf_counter()
+    while True:
+        # Reading and parsing is blocking file I/O
+        chunk = await asyncio.to_thread(list, itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        valid = []
+        rejects = []
+        for line_num, row in chunk:
+            parsed, error = _validate(line_num, row, default_user_id)
+            if error is None:
+                valid.append((line_num, row, parsed))
+            else:
+                rejects.append((None if isinstance(row, Exception) else row, error))
+
+        # Rows for users that don't exist would fail the whole chunk on the FK
+        user_ids = {parsed.user_id for _, _, parsed in valid}
+        if user_ids:
+            known = set((await db.execute(select(UserDB.id).where(UserDB.id.in_(user_ids)))).scalars())
+            for line_num, row, parsed in valid:
+                if parsed.user_id not in known:
+                    rejects.append((row, {
+                        "line": line_num,
+                        "errors": [{"loc": ["user_id"], "msg": f"Unknown user {parsed.user_id}", "type": "unknown_user"}]
+                    }))
+            valid = [parsed for _, _, parsed in valid if parsed.user_id in known]
+
+        if valid:
+            now = datetime.datetime.utcnow()
+            await sync_rule_base(db)
+            predictions = await run_inference(
+                get_health_predictions,
+                [r.bmi for r in valid],
+                [r.heart_rate for r in valid],
+                [r.sleep_hours for r in valid],
+                [r.exercise_level for r in valid],
+                rule_base=get_engine().fingerprint
+            )
+            records = [
+                {
+                    "user_id": r.user_id,
+                    "bmi": r.bmi,
+                    "heart_rate": r.heart_rate,
+                    "sleep_hours": r.sleep_hours,
+                    "exercise_level": r.exercise_level,
+                    "risk_score": p["risk_score"],
+                    "risk_level": p["risk_level"],
+                    "recommendation": p["recommendation"],
+                    "rule_base_version": p["rule_base_version"],
+                    "timestamp": r.timestamp or now
+                }
+                for r, p in zip(valid, predictions)
+            ]
+            await db.execute(insert(HealthRecordDB), records)
+            await record_predictions(db, [(r["user_id"], r["timestamp"], r["risk_score"], r["risk_level"]) for r in records])
+
+        # Quarantine before committing: a crash in between repeats these
+        # rejects on resume rather than losing them (stored ones are
+        # committed with the chunk)
+        for row, error in rejects:
+            if on_invalid == "quarantine" and quarantine is not None:
+                quarantine(row, error)
+            elif on_invalid == "quarantine":
+                db.add(ImportRejectDB(
+                    job_id=job.id, line=error["line"], errors=json.dumps(error["errors"]),
+                    row=json.dumps(row, default=str) if row is not None else None
+                ))
+            if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+                errors.append(error)
+
+        job.rows_processed += len(chunk)
+        job.rows_imported += len(valid)
+        job.rows_rejected += len(rejects)
+        await db.commit()
+
+        processed += len(chunk)
+        imported += len(valid)
+        rejected += len(rejects)
+
+        elapsed = time.perf_counter() - start
+        logger.info(f"Import {job.id}: {job.rows_processed} rows ({processed / elapsed:.0f} rows/s)")
+
+    job.status = "completed"
+    await db.commit()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "rows_processed": processed,
+        "rows_imported": imported,
+        "rows_rejected": rejected,
+        "total_rows_processed": job.rows_processed,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(processed / elapsed, 1) if elapsed > 0 else 0.0,
+        "errors": errors
+    }
+
+
+async def iter_rejects(job_id, batch_size=1000):
+    """Yield an import's stored rejects as NDJSON lines, in the reject-file format.
+
+    Reads in id order one batch per session, so a long download doesn't
+    hold a connection.
+    """
+    last_id = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            batch = (await db.execute(
+                select(ImportRejectDB.id, ImportRejectDB.line, ImportRejectDB.row, ImportRejectDB.errors)
+                .where(ImportRejectDB.job_id == job_id, ImportRejectDB.id > last_id)
+                .order_by(ImportRejectDB.id)
+                .limit(batch_size)
+            )).all()
+        if not batch:
+            return
+        last_id = batch[-1].id
+        yield "".join(
+            json.dumps({"row": json.loads(r.row) if r.row is not None else None, "line": r.line,
+                        "errors": json.loads(r.errors)}) + "\n"
+            for r in batch
+        )
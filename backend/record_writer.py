@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+
+from fastapi import HTTPException, status
+from sqlalchemy import insert
+
+from database import AsyncSessionLocal
+from models.domain import HealthRecordDB
+from analytics import record_predictions
+
+logger = logging.getLogger(__name__)
+
+# "sync" commits every prediction in its request (default); "write_behind"
+# queues them in-process and inserts them in multi-row batches. Queued rows
+# not yet flushed are lost if the process dies without a clean shutdown;
+# callers that can't accept that pass durable=true to get a synchronous commit.
+RECORD_WRITE_MODE = os.getenv("RECORD_WRITE_MODE", "sync").lower()
+RECORD_QUEUE_SIZE = int(os.getenv("RECORD_QUEUE_SIZE", "10000"))
+RECORD_FLUSH_SIZE = int(os.getenv("RECORD_FLUSH_SIZE", "500"))
+RECORD_FLUSH_INTERVAL = float(os.getenv("RECORD_FLUSH_INTERVAL", "0.5"))
+# How long a request waits for queue space before it is rejected with a 503
+RECORD_ENQUEUE_TIMEOUT = float(os.getenv("RECORD_ENQUEUE_TIMEOUT", "2"))
+RECORD_FLUSH_RETRIES = 3
+# Rows that still fail when written one by one after a batch failed (e.g. a
+# record of a user deleted while it was queued) are appended here as JSON
+# lines, one per row with its error, to be fixed and re-imported
+RECORD_QUARANTINE_FILE = os.getenv(
+    "RECORD_QUARANTINE_FILE", os.path.join(tempfile.gettempdir(), "smart_health_failed_records.jsonl")
+)
+
+
+class RecordWriter:
+    """Bounded asyncio queue of health record rows flushed in batches."""
+
+    def __init__(self, queue_size=RECORD_QUEUE_SIZE, flush_size=RECORD_FLUSH_SIZE,
+                 flush_interval=RECORD_FLUSH_INTERVAL):
+        self.queue_size = queue_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.enqueued = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.rejected = 0
+        self.failed = 0
+        self._queue = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Write-behind record writer started (batch {self.flush_size}, every {self.flush_interval}s)")
+
+    async def stop(self):
+        # Flush whatever is still queued before the process exits
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        logger.info(f"Write-behind record writer stopped, {self.flushed} records flushed")
+
+    async def enqueue(self, row):
+        try:
+            await asyncio.wait_for(self._queue.put(row), timeout=RECORD_ENQUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.enqueued += 1
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            row = await self._queue.get()
+            if row is None:
+                break
+            batch = [row]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._flush(batch)
+
+        # Drain anything enqueued behind the stop marker
+        remaining = []
+        while not self._queue.empty():
+            row = self._queue.get_nowait()
+            if row is not None:
+                remaining.append(row)
+        for start in range(0, len(remaining), self.flush_size):
+            await self._flush(remaining[start:start + self.flush_size])
+
+    async def _write(self, rows):
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(HealthRecordDB), rows)
+            await record_predictions(db, [(r["user_id"], r["timestamp"], r["risk_score"], r["risk_level"]) for r in rows])
+            await db.commit()
+
+    async def _flush(self, batch):
+        for attempt in range(1, RECORD_FLUSH_RETRIES + 1):
+            try:
+                await self._write(batch)
+                self.flushed += len(batch)
+                self.flushes += 1
+                return
+            except Exception as e:
+                logger.error(f"Flushing {len(batch)} health records failed (attempt {attempt}): {e}")
+                await asyncio.sleep(0.5 * attempt)
+
+        # One bad row fails the whole batch: write the rows one by one so the
+        # good ones are kept, and quarantine only those that still fail
+        written = 0
+        for row in batch:
+            try:
+                await self._write([row])
+                written += 1
+            except Exception as e:
+                self._quarantine(row, e)
+        self.flushed += written
+        self.failed += len(batch) - written
+        logger.error(f"Wrote {written} of {len(batch)} health records one by one, "
+                     f"quarantined {len(batch) - written} in {RECORD_QUARANTINE_FILE}")
+
+    def _quarantine(self, row, error):
+        try:
+            with open(RECORD_QUARANTINE_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"row": row, "error": str(error)}, default=str) + "\n")
+        except OSError as e:
+            logger.error(f"Could not quarantine health record {row}: {e}")
+
+    def stats(self):
+        return {
+            "mode": RECORD_WRITE_MODE,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.queue_size,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "quarantine_file": RECORD_QUARANTINE_FILE,
+        }
+
+
+record_writer = RecordWriter()
+
+
+def write_behind_enabled():
+    return RECORD_WRITE_MODE == "write_behind" and record_writer.running
@@ -0,0 +1,172 @@
+import itertools
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from fuzzy_engine import get_engine
+
+logger = logging.getLogger(__name__)
+
+# Grid points per input axis (bmi, heart_rate, sleep_hours, exercise_level).
+# The default puts a node on every integer of each input universe except
+# heart rate (every 2 bpm): ~0.8M float32 cells, ~3.3 MB.
+LUT_POINTS = os.getenv("FUZZY_LUT_POINTS", "31,71,25,15")
+LUT_CACHE_DIR = os.getenv("FUZZY_LUT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "smart_health_lut"))
+# Prebuilt tables shipped with the code (scripts/build_risk_lut.py --artifact).
+# Checked before the cache, so serverless instances whose /tmp starts empty
+# map the table instead of spending ~20s building it on a cold start.
+LUT_ARTIFACT_DIR = os.getenv(
+    "FUZZY_LUT_ARTIFACT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts")
+)
+# Random inputs scored both ways to report the interpolation error at build time
+LUT_ERROR_SAMPLES = int(os.getenv("FUZZY_LUT_ERROR_SAMPLES", "5000"))
+
+
+def parse_points(points):
+    if isinstance(points, str):
+        points = [int(p) for p in points.split(",")]
+    return tuple(int(p) for p in points)
+
+
+class RiskLookupTable:
+    """Risk score tabulated on a 4-D grid, queried by multilinear interpolation.
+
+    Cells whose surrounding grid nodes include a point where no rule fires
+    (NaN in the table) are answered by the exact engine instead, so the
+    fallback scoring behaves exactly as without the table.
+    """
+
+    def __init__(self, engine, axes, table):
+        self.engine = engine
+        self.axes = axes
+        self.table = table
+        self.max_error = None
+        self.mean_error = None
+
+        # Flat-index offsets of the 2^d corners of a grid cell
+        self._flat = table.reshape(-1)
+        self._strides = np.array(table.strides) // table.itemsize
+        self._corner_bits = np.array(list(itertools.product((0, 1), repeat=len(axes))), dtype=bool)
+        self._corner_offsets = self._corner_bits.astype(np.intp) @ self._strides
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    @classmethod
+    def axes_for(cls, engine, points):
+        # Grid spans each input universe, i.e. the HealthInput bounds
+        return [np.linspace(universe[0], universe[-1], n) for universe, n in zip(engine.universes, points)]
+
+    @classmethod
+    def build(cls, engine, points):
+        axes = cls.axes_for(engine, points)
+        grid = np.meshgrid(*axes, indexing="ij")
+        scores = engine.evaluate(*[g.ravel() for g in grid])
+        return cls(engine, axes, scores.reshape(points).astype(np.float32))
+
+    @classmethod
+    def cache_path(cls, engine, points, cache_dir=LUT_CACHE_DIR):
+        shape = "x".join(str(p) for p in points)
+        return os.path.join(cache_dir, f"risk_lut_{engine.fingerprint[:16]}_{shape}.npy")
+
+    @classmethod
+    def load_or_build(cls, engine, points, cache_dir=LUT_CACHE_DIR):
+        # File names carry the rule base fingerprint, so a stale artifact is never picked up
+        path = cls.cache_path(engine, points, cache_dir)
+        for candidate in (cls.cache_path(engine, points, LUT_ARTIFACT_DIR), path):
+            if os.path.exists(candidate):
+                table = np.load(candidate, mmap_mode="r")
+                if table.shape == tuple(points):
+                    logger.info(f"Loaded risk lookup table {candidate}")
+                    return cls(engine, cls.axes_for(engine, points), table)
+
+        start = time.perf_counter()
+        lut = cls.build(engine, points)
+        lut.measure_error()
+        logger.info(
+            f"Built risk lookup table {'x'.join(str(p) for p in points)} in {time.perf_counter() - start:.1f}s "
+            f"({lut.nbytes / 1e6:.1f} MB): max interpolation error {lut.max_error:.4f}, mean {lut.mean_error:.4f}"
+        )
+
+        try:
+            lut.save(path)
+        except OSError as e:
+            logger.warning(f"Could not cache risk lookup table at {path}: {e}")
+        return lut
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write then rename so concurrent workers never map a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npy")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, self.table)
+        os.replace(tmp_path, path)
+
+    def interpolate(self, *inputs):
+        """Interpolated scores; NaN where a contributing grid node is NaN or out of range."""
+        arrays = [np.atleast_1d(np.asarray(v, dtype=np.float64)) for v in inputs]
+        n = len(arrays[0])
+        out_of_range = np.zeros(n, dtype=bool)
+        base = np.zeros(n, dtype=np.intp)
+        weights = np.empty((n, len(self.axes)))
+        for d, (x, axis) in enumerate(zip(arrays, self.axes)):
+            i = np.clip(np.searchsorted(axis, x, side="right") - 1, 0, len(axis) - 2)
+            base += i * self._strides[d]
+            weights[:, d] = (x - axis[i]) / (axis[i + 1] - axis[i])
+            out_of_range |= (x < axis[0]) | (x > axis[-1])
+
+        # (N x 2^d) corner values and weights gathered in one go
+        values = self._flat[base[:, None] + self._corner_offsets]
+        corner_weights = np.where(self._corner_bits, weights[:, None, :], 1.0 - weights[:, None, :]).prod(axis=2)
+        # Skip zero-weight corners so a NaN neighbour doesn't leak in
+        result = np.where(corner_weights > 0, corner_weights * values, 0.0).sum(axis=1)
+
+        result[out_of_range] = np.nan
+        return result
+
+    def evaluate(self, *inputs):
+        scores = self.interpolate(*inputs)
+        missing = np.isnan(scores)
+        if missing.any():
+            arrays = [np.atleast_1d(np.asarray(v, dtype=np.float64)) for v in inputs]
+            scores[missing] = self.engine.evaluate(*[a[missing] for a in arrays])
+        return scores
+
+    def measure_error(self, samples=LUT_ERROR_SAMPLES, seed=0):
+        rng = np.random.default_rng(seed)
+        points = [rng.uniform(axis[0], axis[-1], samples) for axis in self.axes]
+        exact = self.engine.evaluate(*points)
+        approx = self.interpolate(*points)
+        both = ~np.isnan(exact) & ~np.isnan(approx)
+        error = np.abs(exact[both] - approx[both])
+        self.max_error = float(error.max()) if error.size else 0.0
+        self.mean_error = float(error.mean()) if error.size else 0.0
+        return self.max_error, self.mean_error
+
+
+# Tables by rule base fingerprint: the active one and, right after a swap,
+# the one in-flight requests on the previous rule base still use
+LUT_KEEP = 2
+_luts = OrderedDict()
+_luts_lock = threading.Lock()
+
+
+def get_lut(engine=None):
+    # Built (or loaded from the cache) once per process and rule base, on first use
+    engine = engine or get_engine()
+    with _luts_lock:
+        lut = _luts.get(engine.fingerprint)
+    if lut is None:
+        lut = RiskLookupTable.load_or_build(engine, parse_points(LUT_POINTS))
+        with _luts_lock:
+            _luts[engine.fingerprint] = lut
+            while len(_luts) > LUT_KEEP:
+                _luts.popitem(last=False)
+    return lut
@@ -0,0 +1,43 @@
+import numpy as np
+
+from fuzzy_engine import INPUT_ORDER, engine_for, fallback_score, score_inputs
+
+
+def surface_axes(engine, x_input, y_input, resolution):
+    # Each axis spans its input's universe, i.e. the HealthInput bounds
+    universes = dict(zip(INPUT_ORDER, engine.universes))
+    return (np.linspace(universes[x_input][0], universes[x_input][-1], resolution),
+            np.linspace(universes[y_input][0], universes[y_input][-1], resolution))
+
+
+def compute_surface(x_input, y_input, fixed, resolution, rule_base=None):
+    """Risk scores over a resolution x resolution grid of two inputs.
+
+    The other two inputs are held at their values in fixed. The whole grid
+    is scored in one vectorized engine pass. Cells where no rule fires get
+    the fallback score, as /predict-risk would return. scores[i, j] is the
+    score at (x[j], y[i]).
+    """
+    engine = engine_for(rule_base)
+    x_axis, y_axis = surface_axes(engine, x_input, y_input, resolution)
+    ys, xs = np.meshgrid(y_axis, x_axis, indexing="ij")
+    columns = [
+        xs.ravel() if name == x_input else ys.ravel() if name == y_input else np.full(xs.size, float(fixed[name]))
+        for name in INPUT_ORDER
+    ]
+
+    scores = score_inputs(*columns, engine=engine)
+    missing = np.isnan(scores)
+    if missing.any():
+        scores[missing] = [fallback_score(*values) for values in zip(*(c[missing] for c in columns))]
+
+    return {
+        "rule_base_version": engine.version,
+        "x": {"input": x_input, "min": float(x_axis[0]), "max": float(x_axis[-1])},
+        "y": {"input": y_input, "min": float(y_axis[0]), "max": float(y_axis[-1])},
+        "fixed": {name: float(value) for name, value in fixed.items()},
+        "resolution": resolution,
+        "fallback_cells": int(missing.sum()),
+        # float32 halves what the cache holds; scores are reported to 2 decimals anyway
+        "scores": scores.reshape(resolution, resolution).astype(np.float32),
+    }
@@ -1,60 +1,195 @@
-from fastapi import APIRouter, Depends
-from typing import List, Dict
+import io
+from datetime import datetime
+from fastapi import APIRouter, Body, Depends, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import Any, List, Dict, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import func
 
-from database import get_db
+from database import get_db, get_pool_stats
 from routes.auth import get_current_admin_user
+from routes.live import live_stats
 from models.user import UserResponse
-from models.domain import UserDB, HealthRecordDB
+from models.domain import UserDB, ImportJobDB
+from analytics import read_analytics, read_daily, read_summary, rebuild_aggregates, check_consistency, summarize
+from prediction_cache import prediction_cache, surface_cache
+from auth_cache import principal_cache
+from executors import inference_executor, bcrypt_executor
+from record_writer import record_writer
+from record_import import RecordImportError, detect_format, iter_rejects, iter_rows, import_records
+from metrics import TimedRoute, profile_store
+from serialization import ORJSONResponse, cache_headers, json_rows, make_etag, not_modified
+from record_export import MEDIA_TYPES, STREAMERS, export_filename, export_query
+from rule_base_store import activate_rule_base, activate_stored_rule_base, list_rule_bases, rule_base_summary
 
-router = APIRouter(prefix="/admin", tags=["Admin"])
+router = APIRouter(prefix="/admin", tags=["Admin"], route_class=TimedRoute)
+
+# Selected in UserResponse's field order so rows serialize straight to the response model
+USER_FIELDS = tuple(UserResponse.model_fields)
 
 @router.get("/all-users", response_model=List[UserResponse])
 async def get_all_users(admin: dict = Depends(get_current_admin_user), db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(UserDB))
-    db_users = result.scalars().all()
-    
-    users = []
-    for doc in db_users:
-        users.append(UserResponse(
-            id=doc.id,
-            name=doc.name,
-            email=doc.email,
-            age=doc.age,
-            gender=doc.gender,
-            role=doc.role
-        ))
-    return users
+    result = await db.execute(select(*(getattr(UserDB, field) for field in USER_FIELDS)))
+    return json_rows(USER_FIELDS, result.all())
 
 @router.get("/analytics")
-async def get_analytics(admin: dict = Depends(get_current_admin_user), db: AsyncSession = Depends(get_db)):
-    # Total Users
-    total_users_result = await db.execute(select(func.count(UserDB.id)))
-    total_users = total_users_result.scalar() or 0
-    
-    # Total Predictions
-    total_predictions_result = await db.execute(select(func.count(HealthRecordDB.id)))
-    total_predictions = total_predictions_result.scalar() or 0
-    
-    # Calculate average risk score
-    avg_risk_result = await db.execute(select(func.avg(HealthRecordDB.risk_score)))
-    avg_risk = avg_risk_result.scalar() or 0
-    
-    # Risk distribution
-    risk_dist_result = await db.execute(
-        select(HealthRecordDB.risk_level, func.count(HealthRecordDB.id))
-        .group_by(HealthRecordDB.risk_level)
-    )
-    
-    risk_distribution = {}
-    for row in risk_dist_result:
-        risk_distribution[row[0]] = row[1]
-        
+async def get_analytics(request: Request, admin: dict = Depends(get_current_admin_user), db: AsyncSession = Depends(get_db)):
+    # Served from the incrementally maintained summary row; its counters are
+    # the version, so an unchanged dashboard costs one primary key lookup
+    summary = await read_summary(db)
+    etag = make_etag("analytics", *summary)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+    return ORJSONResponse(summarize(summary), headers=cache_headers(etag))
+
+@router.get("/analytics/daily")
+async def get_daily_analytics(request: Request, days: int = Query(30, ge=1, le=366), admin: dict = Depends(get_current_admin_user), db: AsyncSession = Depends(get_db)):
+    # The daily rows change with the summary row; the date moves the window
+    summary = await read_summary(db)
+    etag = make_etag("analytics_daily", days, datetime.utcnow().date(), *summary)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+    return ORJSONResponse(await read_daily(db, days), headers=cache_headers(etag))
+
+@router.post("/analytics/rebuild")
+async def rebuild_analytics(admin: dict = Depends(get_current_admin_user), db: AsyncSession = Depends(get_db)):
+    await rebuild_aggregates(db)
+    await db.commit()
+    return await read_analytics(db)
+
+@router.get("/analytics/consistency")
+async def get_analytics_consistency(admin: dict = Depends(get_current_admin_user), db: AsyncSession = Depends(get_db)):
+    return await check_consistency(db)
+
+@router.get("/cache-stats")
+async def get_cache_stats(admin: dict = Depends(get_current_admin_user)):
     return {
-        "total_users": total_users,
-        "total_predictions": total_predictions,
-        "average_risk_score": round(float(avg_risk), 2) if avg_risk else 0,
-        "risk_distribution": risk_distribution
+        "prediction_cache": prediction_cache.stats(),
+        "surface_cache": surface_cache.stats(),
+        "auth_cache": principal_cache.stats(),
+        "executors": {
+            "inference": inference_executor.stats(),
+            "bcrypt": bcrypt_executor.stats()
+        },
+        "record_writer": record_writer.stats(),
+        "live_preview": live_stats.stats()
     }
+
+@router.get("/db-pool")
+async def get_db_pool_stats(admin: dict = Depends(get_current_admin_user)):
+    return get_pool_stats()
+
+@router.post("/import")
+async def import_health_records(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, description="csv or ndjson; detected from the file name if omitted"),
+    user_id: Optional[str] = Query(None, description="Owner for rows without a user_id column; fixed when the job starts"),
+    job_id: Optional[str] = Query(None, description="Resume an interrupted import of the same file"),
+    admin: dict = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
+):
+    source = file.filename or "upload"
+    try:
+        fmt = detect_format(source, format)
+        # The upload is spooled to disk; rows are read from it one chunk at a
+        # time, in a worker thread. Rejected rows are stored with the job.
+        text = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+        return await import_records(db, iter_rows(text, fmt), source, job_id=job_id, default_user_id=user_id)
+    except RecordImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Import file must be UTF-8 encoded")
+
+@router.get("/import/{job_id}")
+async def get_import_job(job_id: str, admin: dict = Depends(get_current_admin_user), db: AsyncSession = Depends(get_db)):
+    job = await db.get(ImportJobDB, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return {
+        "job_id": job.id,
+        "source": job.source,
+        "status": job.status,
+        "rows_processed": job.rows_processed,
+        "rows_imported": job.rows_imported,
+        "rows_rejected": job.rows_rejected,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at
+    }
+
+@router.get("/import/{job_id}/rejects")
+async def download_import_rejects(job_id: str, admin: dict = Depends(get_current_admin_user), db: AsyncSession = Depends(get_db)):
+    # Every row the job rejected, as NDJSON: {"row": ..., "line": ..., "errors": [...]},
+    # the same format as the CLI's reject file
+    if await db.get(ImportJobDB, job_id) is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return StreamingResponse(
+        iter_rejects(job_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="import-{job_id}-rejects.ndjson"'}
+    )
+
+@router.get("/export")
+async def export_health_records(
+    format: str = Query("parquet", pattern="^(csv|ndjson|parquet)$"),
+    start: Optional[datetime] = Query(None, description="Only records at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only records before this time"),
+    user_id: Optional[str] = Query(None, description="Only this user's records"),
+    admin: dict = Depends(get_current_admin_user)
+):
+    return StreamingResponse(
+        STREAMERS[format](export_query(user_id=user_id, start=start, end=end)),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(format, user_id)}"'}
+    )
+
+@router.get("/profiles")
+async def list_profiles(admin: dict = Depends(get_current_admin_user)):
+    # Requests sent with "X-Profile: 1"; newest first
+    return profile_store.list()
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, admin: dict = Depends(get_current_admin_user)):
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    # Collapsed stacks, for flamegraph.pl or speedscope
+    return PlainTextResponse(profile["stacks"])
+
+@router.get("/rule-base")
+async def get_rule_base(admin: dict = Depends(get_current_admin_user)):
+    # The rule base this process is serving, with its full document
+    from fuzzy_engine import get_engine
+
+    engine = get_engine()
+    return {**rule_base_summary(engine), "document": engine.document}
+
+@router.put("/rule-base")
+async def put_rule_base(document: Dict[str, Any] = Body(...), admin: dict = Depends(get_current_admin_user), db: AsyncSession = Depends(get_db)):
+    # Validates and compiles the document, then swaps it in atomically;
+    # predictions already running finish on the previous rule base
+    from fuzzy_engine import RuleBaseError, get_engine
+
+    previous = get_engine().version
+    try:
+        engine = await activate_rule_base(db, document, admin_id=str(admin["_id"]))
+    except RuleBaseError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid rule base: {e}")
+    return {**rule_base_summary(engine), "previous_version": previous}
+
+@router.get("/rule-bases")
+async def get_rule_bases(admin: dict = Depends(get_current_admin_user), db: AsyncSession = Depends(get_db)):
+    # Every version activated so far, newest first
+    return await list_rule_bases(db)
+
+@router.post("/rule-bases/{version}/activate")
+async def activate_rule_base_version(version: str, admin: dict = Depends(get_current_admin_user), db: AsyncSession = Depends(get_db)):
+    from fuzzy_engine import RuleBaseError, get_engine
+
+    previous = get_engine().version
+    try:
+        engine = await activate_stored_rule_base(db, version, admin_id=str(admin["_id"]))
+    except RuleBaseError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid rule base: {e}")
+    return {**rule_base_summary(engine), "previous_version": previous}
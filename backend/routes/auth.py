@@ -6,12 +6,17 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 import bcrypt
 from dotenv import load_dotenv
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from database import get_db
+from executors import run_bcrypt
+from auth_cache import principal_cache
+from analytics import record_user_created
+from metrics import TimedRoute, current_request, stage
 from models.user import UserCreate, UserLogin, UserResponse, Token, TokenData
-from models.domain import UserDB
+from models.domain import FirstAdminDB, UserDB
 
 load_dotenv()
 
@@ -20,10 +25,13 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-for-development")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 # 1 day
 
+# bcrypt work factor for new password hashes; existing hashes keep their own
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
 # removed passlib CryptContext due to version conflicts with bcrypt 4.0+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-router = APIRouter(tags=["Authentication"])
+router = APIRouter(tags=["Authentication"], route_class=TimedRoute)
 
 # Helper Functions
 def verify_password(plain_password: str, hashed_password: str):
@@ -38,7 +46,7 @@ def verify_password(plain_password: str, hashed_password: str):
 def get_password_hash(password: str):
     # Truncate to 72 characters as per bcrypt limit
     password_bytes = password[:72].encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(BCRYPT_ROUNDS)
     hashed_bytes = bcrypt.hashpw(password_bytes, salt)
     return hashed_bytes.decode('utf-8')
 
@@ -58,16 +66,29 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        user_id: str = payload.get("id")
-        role: str = payload.get("role")
-        if email is None:
+    with stage("auth"):
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            email: str = payload.get("sub")
+            user_id: str = payload.get("id")
+            role: str = payload.get("role")
+            if email is None:
+                raise credentials_exception
+            token_data = TokenData(email=email, user_id=user_id, role=role)
+        except JWTError:
             raise credentials_exception
-        token_data = TokenData(email=email, user_id=user_id, role=role)
-    except JWTError:
-        raise credentials_exception
+        
+        # Token is verified at this point; skip the user lookup if we resolved
+        # this exact token recently
+        signature = token.rsplit(".", 1)[-1]
+        principal = principal_cache.get(token_data.user_id, signature) if principal_cache.enabled else None
+    
+    request_metrics = current_request()
+    if principal is not None:
+        if request_metrics is not None:
+            # Lets the request profiler confirm the caller is an admin
+            request_metrics["principal"] = principal
+        return principal
     
     result = await db.execute(select(UserDB).where(UserDB.id == token_data.user_id))
     user = result.scalars().first()
@@ -75,7 +96,12 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
         raise credentials_exception
     
     # Return as dict-like object for compatibility with existing code
-    return {"_id": user.id, "email": user.email, "role": user.role, "name": user.name}
+    principal = {"_id": user.id, "email": user.email, "role": user.role, "name": user.name}
+    if principal_cache.enabled:
+        principal_cache.put(user.id, signature, principal)
+    if request_metrics is not None:
+        request_metrics["principal"] = principal
+    return principal
 
 async def get_current_admin_user(current_user: dict = Depends(get_current_user)):
     if current_user.get("role") != "admin":
@@ -88,37 +114,53 @@ async def get_current_admin_user(current_user: dict = Depends(get_current_user))
 # Endpoints
 @router.post("/register", response_model=UserResponse)
 async def register(user_in: UserCreate, db: AsyncSession = Depends(get_db)):
-    # Check if user exists
-    result = await db.execute(select(UserDB).where(UserDB.email == user_in.email))
-    if result.scalars().first():
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    # First user becomes admin (convenience for setup)
-    count_result = await db.execute(select(UserDB))
-    is_admin = len(count_result.scalars().all()) == 0
-    role = "admin" if is_admin else "user"
-    
+    # Hash before touching the database so the transaction stays short
+    password = await run_bcrypt(get_password_hash, user_in.password)
+
+    # First user becomes admin (convenience for setup). An index probe, not a
+    # scan of the users table; the FirstAdminDB claim below settles races.
+    is_first = (await db.execute(select(UserDB.id).limit(1))).first() is None
+
     new_user = UserDB(
         name=user_in.name,
         email=user_in.email,
         age=user_in.age,
         gender=user_in.gender,
-        password=get_password_hash(user_in.password),
-        role=role
+        password=password,
+        role="user"
     )
-    
     db.add(new_user)
+    try:
+        # The unique index on email catches duplicates, concurrent ones included
+        await db.flush()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Email already registered")
+
+    if is_first and await claim_first_admin(db, new_user.id):
+        new_user.role = "admin"
+    await record_user_created(db)
     await db.commit()
-    await db.refresh(new_user)
-    
+
     return new_user
 
+async def claim_first_admin(db: AsyncSession, user_id: str):
+    # Concurrent first sign-ups all see an empty users table; only one of
+    # them can insert the claim row. The others wait on its lock and, once it
+    # commits, hit the duplicate key and stay plain users.
+    try:
+        async with db.begin_nested():
+            db.add(FirstAdminDB(id=1, user_id=user_id))
+    except IntegrityError:
+        return False
+    return True
+
 @router.post("/login", response_model=Token)
 async def login(user_in: UserLogin, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(UserDB).where(UserDB.email == user_in.email))
     user = result.scalars().first()
     
-    if not user or not verify_password(user_in.password, user.password):
+    if not user or not await run_bcrypt(verify_password, user_in.password, user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
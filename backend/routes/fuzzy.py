@@ -0,0 +1,87 @@
+import os
+from typing import Annotated, Literal
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import Response
+from pydantic import Field
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db
+from executors import run_inference
+from models.health_record import HealthInput
+from prediction_cache import get_cached_surface
+from rule_base_store import sync_rule_base
+from routes.auth import get_current_user
+from metrics import TimedRoute, stage
+from serialization import ORJSONResponse
+
+# Grid points per axis of /fuzzy/surface when the client doesn't ask, and the cap
+SURFACE_RESOLUTION = int(os.getenv("SURFACE_RESOLUTION", "41"))
+SURFACE_MAX_RESOLUTION = int(os.getenv("SURFACE_MAX_RESOLUTION", "101"))
+
+InputName = Literal["bmi", "heart_rate", "sleep_hours", "exercise_level"]
+
+# Query parameter models: the HealthInput fields plus the endpoint's options,
+# validated with the same bounds as /predict-risk
+class SurfaceQuery(HealthInput):
+    x: InputName = Field(description="Input along the grid's columns")
+    y: InputName = Field(description="Input along the grid's rows")
+    resolution: int = Field(SURFACE_RESOLUTION, ge=2, le=SURFACE_MAX_RESOLUTION)
+    format: Literal["json", "f32"] = "json"
+
+class ExplainQuery(HealthInput):
+    curves: bool = Field(True, description="Include the membership curves; they only change with the rule base")
+
+router = APIRouter(prefix="/fuzzy", tags=["Fuzzy Engine"], route_class=TimedRoute)
+
+@router.get("/surface")
+async def get_risk_surface(
+    query: Annotated[SurfaceQuery, Query()],
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    # Risk across two inputs with the other two held at the given values
+    # (the x and y values only mark the client's current point). json
+    # returns scores as one flat row-major list; f32 returns the same grid
+    # as little-endian float32 bytes, described by the X-Surface-* headers.
+    x, y, resolution = query.x, query.y, query.resolution
+    if x == y:
+        raise HTTPException(status_code=400, detail="x and y must be different inputs")
+    fixed = {name: value for name, value in query.model_dump(include=set(HealthInput.model_fields)).items()
+             if name not in (x, y)}
+
+    await sync_rule_base(db)
+    surface = await get_cached_surface(x, y, fixed, resolution)
+    scores = surface.pop("scores")
+
+    with stage("serialization"):
+        if query.format == "f32":
+            return Response(
+                scores.astype("<f4").tobytes(),
+                media_type="application/octet-stream",
+                headers={
+                    "X-Rule-Base-Version": surface["rule_base_version"],
+                    "X-Surface-Shape": f"{resolution},{resolution}",
+                    "X-Surface-X": f"{x},{surface['x']['min']:g},{surface['x']['max']:g}",
+                    "X-Surface-Y": f"{y},{surface['y']['min']:g},{surface['y']['max']:g}",
+                }
+            )
+        surface["scores"] = scores.astype("f8").round(2).ravel().tolist()
+        return ORJSONResponse(surface)
+
+@router.get("/explain")
+async def explain_risk(
+    query: Annotated[ExplainQuery, Query()],
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    # Membership degrees, per-rule firing strengths and output cut levels
+    # behind the score for one input
+    from fuzzy_engine import explain_prediction, get_engine
+
+    await sync_rule_base(db)
+    explanation = await run_inference(
+        explain_prediction, query.bmi, query.heart_rate, query.sleep_hours, query.exercise_level,
+        curves=query.curves, rule_base=get_engine().fingerprint
+    )
+    with stage("serialization"):
+        return ORJSONResponse(explanation)
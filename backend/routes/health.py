@@ -1,20 +1,92 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+import base64
+import json
+import os
+from datetime import datetime
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from typing import Any, List, Literal, Optional
+from pydantic import ValidationError
+from sqlalchemy import func, insert, or_, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from database import get_db
-from models.health_record import HealthInput, PredictionResult, HealthRecord
+from executors import run_inference
+from models.health_record import HealthInput, PredictionResult, HealthRecord, BatchPredictionResponse
 from models.domain import HealthRecordDB
-from fuzzy_engine import get_health_prediction
+from prediction_cache import get_cached_prediction
+from rule_base_store import sync_rule_base
 from routes.auth import get_current_user
+from analytics import read_trends, record_predictions
+from record_writer import record_writer, write_behind_enabled
+from metrics import TimedRoute
+from serialization import ORJSONResponse, cache_headers, json_rows, make_etag, not_modified
+from record_export import MEDIA_TYPES, STREAMERS, export_filename, export_query
 
-router = APIRouter(tags=["Health Risk"])
+# Upper bound on inputs accepted by /predict-risk/batch in one request
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "1000"))
+
+# /history page size when the client doesn't ask for one, and the cap
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "100"))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "1000"))
+
+# /trends periods returned when the client doesn't ask, per period length, and the cap
+TRENDS_DEFAULT_BUCKETS = {"day": 30, "week": 12, "month": 12}
+TRENDS_MAX_BUCKETS = int(os.getenv("TRENDS_MAX_BUCKETS", "366"))
+
+# Selected in HealthRecord's field order so rows serialize straight to the response model
+HISTORY_FIELDS = tuple(HealthRecord.model_fields)
+HISTORY_COLUMNS = tuple(getattr(HealthRecordDB, field) for field in HISTORY_FIELDS)
+
+router = APIRouter(tags=["Health Risk"], route_class=TimedRoute)
+
+def encode_cursor(timestamp: datetime, record_id: str) -> str:
+    raw = json.dumps([timestamp.isoformat(), record_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, record_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), str(record_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def store_prediction(db: AsyncSession, user_id: str, health_in: HealthInput, prediction: dict, durable: bool = False):
+    # Save one scored input as a health record: queued for the background
+    # writer in write-behind mode, committed before returning otherwise
+    row = {
+        "user_id": user_id,
+        "bmi": health_in.bmi,
+        "heart_rate": health_in.heart_rate,
+        "sleep_hours": health_in.sleep_hours,
+        "exercise_level": health_in.exercise_level,
+        "risk_score": prediction["risk_score"],
+        "risk_level": prediction["risk_level"],
+        "recommendation": prediction["recommendation"],
+        "rule_base_version": prediction["rule_base_version"],
+        "timestamp": datetime.utcnow()
+    }
+    
+    if write_behind_enabled() and not durable:
+        # Queued and inserted with other records by the background writer
+        await record_writer.enqueue(row)
+        return
+    
+    db.add(HealthRecordDB(**row))
+    await record_predictions(db, [(user_id, row["timestamp"], row["risk_score"], row["risk_level"])])
+    await db.commit()
 
 @router.post("/predict-risk", response_model=PredictionResult)
-async def predict_risk(health_in: HealthInput, current_user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def predict_risk(
+    health_in: HealthInput,
+    durable: bool = Query(False, description="Commit the record before responding, even in write-behind mode"),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
     # Run Fuzzy Logic Engine
-    prediction = get_health_prediction(
+    await sync_rule_base(db)
+    prediction = await get_cached_prediction(
         health_in.bmi, 
         health_in.heart_rate, 
         health_in.sleep_hours, 
@@ -22,43 +94,138 @@ async def predict_risk(health_in: HealthInput, current_user: dict = Depends(get_
     )
     
     # Save record to database
-    db_record = HealthRecordDB(
-        user_id=str(current_user["_id"]),
-        bmi=health_in.bmi,
-        heart_rate=health_in.heart_rate,
-        sleep_hours=health_in.sleep_hours,
-        exercise_level=health_in.exercise_level,
-        risk_score=prediction["risk_score"],
-        risk_level=prediction["risk_level"],
-        recommendation=prediction["recommendation"]
-    )
-    
-    db.add(db_record)
-    await db.commit()
-    
+    await store_prediction(db, str(current_user["_id"]), health_in, prediction, durable=durable)
     return prediction
 
+@router.post("/predict-risk/batch", response_model=BatchPredictionResponse)
+async def predict_risk_batch(items: List[Any] = Body(...), current_user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch size {len(items)} exceeds the maximum of {MAX_BATCH_SIZE}"
+        )
+
+    # Validate each item on its own so one bad row doesn't fail the batch
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, HealthInput.model_validate(item)))
+        except ValidationError as e:
+            results[index] = {
+                "index": index,
+                "errors": [{"loc": list(err["loc"]), "msg": err["msg"], "type": err["type"]} for err in e.errors()]
+            }
+
+    if valid:
+        from fuzzy_engine import get_engine, get_health_predictions
+
+        # Run Fuzzy Logic Engine once over all valid inputs
+        await sync_rule_base(db)
+        inputs = [health_in for _, health_in in valid]
+        predictions = await run_inference(
+            get_health_predictions,
+            [h.bmi for h in inputs],
+            [h.heart_rate for h in inputs],
+            [h.sleep_hours for h in inputs],
+            [h.exercise_level for h in inputs],
+            rule_base=get_engine().fingerprint
+        )
+
+        # Save all records in one multi-row insert and a single transaction
+        user_id = str(current_user["_id"])
+        timestamp = datetime.utcnow()
+        rows = []
+        for (index, health_in), prediction in zip(valid, predictions):
+            results[index] = {"index": index, "result": prediction}
+            rows.append({
+                "user_id": user_id,
+                "bmi": health_in.bmi,
+                "heart_rate": health_in.heart_rate,
+                "sleep_hours": health_in.sleep_hours,
+                "exercise_level": health_in.exercise_level,
+                "risk_score": prediction["risk_score"],
+                "risk_level": prediction["risk_level"],
+                "recommendation": prediction["recommendation"],
+                "rule_base_version": prediction["rule_base_version"],
+                "timestamp": timestamp
+            })
+
+        await db.execute(insert(HealthRecordDB), rows)
+        await record_predictions(db, [(user_id, timestamp, row["risk_score"], row["risk_level"]) for row in rows])
+        await db.commit()
+
+    return {
+        "succeeded": len(valid),
+        "failed": len(items) - len(valid),
+        "results": results
+    }
+
 @router.get("/history", response_model=List[HealthRecord])
-async def get_history(current_user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(HealthRecordDB)
-        .where(HealthRecordDB.user_id == current_user["_id"])
-        .order_by(HealthRecordDB.timestamp.desc())
-    )
-    db_records = result.scalars().all()
-    
-    records = []
-    for doc in db_records:
-        records.append(HealthRecord(
-            id=doc.id,
-            user_id=doc.user_id,
-            bmi=doc.bmi,
-            heart_rate=doc.heart_rate,
-            sleep_hours=doc.sleep_hours,
-            exercise_level=doc.exercise_level,
-            risk_score=doc.risk_score,
-            risk_level=doc.risk_level,
-            recommendation=doc.recommendation,
-            timestamp=doc.timestamp
+async def get_history(
+    request: Request,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    # Keyset pagination on (timestamp, id), newest first, served by the
+    # (user_id, timestamp) index. The next page's cursor is returned in the
+    # X-Next-Cursor header so the body stays a plain list.
+    user_id = current_user["_id"]
+    after = decode_cursor(cursor) if cursor else None
+
+    # Health records are only ever inserted, so the user's record count and
+    # latest timestamp version every page; both come off the same index.
+    # A client that already has this version gets a 304 without the page query.
+    count, latest = (await db.execute(
+        select(func.count(), func.max(HealthRecordDB.timestamp)).where(HealthRecordDB.user_id == user_id)
+    )).one()
+    etag = make_etag("history", user_id, count, latest, limit, cursor)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    query = select(*HISTORY_COLUMNS).where(HealthRecordDB.user_id == user_id)
+    if after:
+        after_timestamp, after_id = after
+        query = query.where(or_(
+            HealthRecordDB.timestamp < after_timestamp,
+            and_(HealthRecordDB.timestamp == after_timestamp, HealthRecordDB.id < after_id)
         ))
-    return records
+    query = query.order_by(HealthRecordDB.timestamp.desc(), HealthRecordDB.id.desc()).limit(limit + 1)
+
+    # Column-only select: plain rows, no ORM identity map, serialized once
+    rows = (await db.execute(query)).all()
+    headers = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers = {"X-Next-Cursor": encode_cursor(rows[-1].timestamp, rows[-1].id)}
+    return json_rows(HISTORY_FIELDS, rows, headers=cache_headers(etag, headers))
+
+@router.get("/history/export")
+async def export_history(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    start: Optional[datetime] = Query(None, description="Only records at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only records before this time"),
+    current_user: dict = Depends(get_current_user)
+):
+    # Streamed from a server-side cursor, so a full history dump never sits in memory
+    user_id = str(current_user["_id"])
+    return StreamingResponse(
+        STREAMERS[format](export_query(user_id=user_id, start=start, end=end)),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(format, user_id)}"'}
+    )
+
+@router.get("/trends")
+async def get_trends(
+    period: Literal["day", "week", "month"] = "day",
+    buckets: Optional[int] = Query(None, ge=1, le=TRENDS_MAX_BUCKETS, description="Number of periods, the current one included"),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    # Mean, min and max risk score and the count per risk level for each of
+    # the user's last `buckets` days, weeks (from Monday) or months, UTC
+    trends = await read_trends(db, current_user["_id"], period, buckets or TRENDS_DEFAULT_BUCKETS[period])
+    return ORJSONResponse(trends)
@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+import orjson
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from jose import jwt
+from pydantic import ValidationError
+
+from database import AsyncSessionLocal
+from models.health_record import HealthInput
+from prediction_cache import get_cached_prediction
+from rule_base_store import sync_rule_base
+from routes.auth import get_current_user
+from routes.health import store_prediction
+
+logger = logging.getLogger(__name__)
+
+# Open live preview sockets per process; further ones are closed with 1013
+LIVE_MAX_CONNECTIONS = int(os.getenv("LIVE_MAX_CONNECTIONS", "200"))
+# Messages per second a connection may send, sustained and in a burst. A
+# client over the cap is closed with 1008; sliders should send at most one
+# preview per animation frame or so, the server only scores the latest anyway.
+LIVE_MESSAGE_RATE = float(os.getenv("LIVE_MESSAGE_RATE", "20"))
+LIVE_MESSAGE_BURST = int(os.getenv("LIVE_MESSAGE_BURST", "40"))
+# Time allowed from connecting to the auth message
+LIVE_AUTH_TIMEOUT = float(os.getenv("LIVE_AUTH_TIMEOUT", "10"))
+LIVE_MAX_MESSAGE_BYTES = 1024
+
+# Close codes: 4401 mirrors HTTP 401 so the client knows to log in again
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_TRY_AGAIN_LATER = 1013
+
+router = APIRouter(tags=["Health Risk"])
+
+
+class LivePreviewStats:
+    def __init__(self):
+        self.open = 0
+        self.peak = 0
+        self.refused = 0
+        self.rate_limited = 0
+        self.previews = 0
+        self.coalesced = 0
+        self.saves = 0
+
+    def stats(self):
+        return {
+            "open": self.open,
+            "peak": self.peak,
+            "max_connections": LIVE_MAX_CONNECTIONS,
+            "refused": self.refused,
+            "rate_limited": self.rate_limited,
+            "previews": self.previews,
+            "coalesced": self.coalesced,
+            "saves": self.saves,
+        }
+
+
+live_stats = LivePreviewStats()
+
+
+class MessageError(ValueError):
+    def __init__(self, detail, errors=None):
+        super().__init__(detail)
+        self.detail = detail
+        self.errors = errors
+
+
+class LivePreviewSession:
+    """One authenticated live preview socket.
+
+    Previews are latest-wins: a preview that arrives while another is still
+    waiting replaces it, so a burst of slider moves costs one evaluation.
+    Nothing is stored unless the client sends a save message; saves are
+    never dropped and are handled in order, ahead of any pending preview.
+    """
+
+    def __init__(self, websocket: WebSocket, principal: dict, expires_at):
+        self.websocket = websocket
+        self.principal = principal
+        self.expires_at = expires_at
+        self.pending = None
+        self.saves = deque()
+        self.closed = False
+        self.wakeup = asyncio.Event()
+        self.send_lock = asyncio.Lock()
+        # Token bucket for the message rate cap
+        self.allowance = float(LIVE_MESSAGE_BURST)
+        self.checked = time.monotonic()
+
+    def allow_message(self):
+        now = time.monotonic()
+        self.allowance = min(LIVE_MESSAGE_BURST, self.allowance + (now - self.checked) * LIVE_MESSAGE_RATE)
+        self.checked = now
+        if self.allowance < 1.0:
+            return False
+        self.allowance -= 1.0
+        return True
+
+    async def send(self, message):
+        if self.closed:
+            return
+        try:
+            async with self.send_lock:
+                await self.websocket.send_text(orjson.dumps(message).decode("utf-8"))
+        except (WebSocketDisconnect, RuntimeError, OSError):
+            # The client went away; receive() finds out on its own
+            self.closed = True
+
+    async def receive(self):
+        # Reads messages until the client goes away or breaks a limit
+        while True:
+            data = await receive_message(self.websocket)
+            if not self.allow_message():
+                live_stats.rate_limited += 1
+                await self.websocket.close(code=CLOSE_POLICY_VIOLATION, reason="Message rate limit exceeded")
+                return
+            if self.expires_at is not None and time.time() >= self.expires_at:
+                await self.websocket.close(code=CLOSE_UNAUTHORIZED, reason="Token expired")
+                return
+
+            message_id = None
+            try:
+                message = parse_message(data)
+                message_id = message.get("id")
+                kind = message.get("type")
+                if kind not in ("preview", "save"):
+                    raise MessageError('type must be "preview" or "save"')
+                health_in = validate_inputs(message)
+            except MessageError as e:
+                await self.send({"type": "error", "id": message_id, "detail": e.detail, "errors": e.errors})
+                continue
+
+            if kind == "save":
+                self.saves.append((message_id, health_in))
+            else:
+                live_stats.previews += 1
+                if self.pending is not None:
+                    live_stats.coalesced += 1
+                self.pending = (message_id, health_in)
+            self.wakeup.set()
+
+    async def evaluate(self):
+        # Runs next to receive(): saves first, then the latest preview.
+        # Returns once the socket is closed and every save is stored.
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while self.saves:
+                message_id, health_in = self.saves.popleft()
+                await self.answer("saved", message_id, health_in, save=True)
+            if self.pending is not None and not self.closed:
+                message_id, health_in = self.pending
+                self.pending = None
+                await self.answer("prediction", message_id, health_in)
+            if self.closed and not self.saves:
+                return
+
+    async def finish(self, evaluator):
+        # A save the client sent before disconnecting is still stored
+        self.closed = True
+        self.wakeup.set()
+        await evaluator
+
+    async def answer(self, kind, message_id, health_in, save=False):
+        try:
+            async with AsyncSessionLocal() as db:
+                await sync_rule_base(db)
+                prediction = await get_cached_prediction(
+                    health_in.bmi, health_in.heart_rate, health_in.sleep_hours, health_in.exercise_level
+                )
+                if save:
+                    await store_prediction(db, str(self.principal["_id"]), health_in, prediction)
+                    live_stats.saves += 1
+        except HTTPException as e:
+            # Overloaded inference pool or record writer
+            await self.send({"type": "error", "id": message_id, "detail": e.detail})
+            return
+        except Exception:
+            logger.exception(f"Live {kind} failed")
+            await self.send({"type": "error", "id": message_id, "detail": "Internal server error"})
+            return
+        await self.send({"type": kind, "id": message_id, **prediction})
+
+
+async def receive_message(websocket: WebSocket):
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    return message.get("text") or message.get("bytes") or ""
+
+
+def parse_message(data):
+    # Counted in UTF-8 bytes: a text frame can be up to 4 per character
+    if len(data) > LIVE_MAX_MESSAGE_BYTES or (isinstance(data, str) and len(data.encode("utf-8")) > LIVE_MAX_MESSAGE_BYTES):
+        raise MessageError(f"Messages are limited to {LIVE_MAX_MESSAGE_BYTES} bytes")
+    try:
+        message = orjson.loads(data)
+    except orjson.JSONDecodeError:
+        raise MessageError("Messages must be JSON objects")
+    if not isinstance(message, dict):
+        raise MessageError("Messages must be JSON objects")
+    return message
+
+
+def validate_inputs(message):
+    try:
+        return HealthInput.model_validate(message)
+    except ValidationError as e:
+        raise MessageError("Invalid input", [
+            {"loc": list(err["loc"]), "msg": err["msg"], "type": err["type"]} for err in e.errors()
+        ])
+
+
+async def authenticate(websocket: WebSocket):
+    # The first message carries the same bearer token as HTTP requests:
+    # {"type": "auth", "token": "..."}. Browsers can't set headers on a
+    # WebSocket, and a token in the URL would end up in access logs.
+    try:
+        message = parse_message(await asyncio.wait_for(receive_message(websocket), LIVE_AUTH_TIMEOUT))
+        token = message.get("token") if message.get("type") == "auth" else None
+    except (asyncio.TimeoutError, MessageError):
+        token = None
+    if not isinstance(token, str):
+        await websocket.close(code=CLOSE_UNAUTHORIZED, reason="Authentication required")
+        return None
+
+    async with AsyncSessionLocal() as db:
+        try:
+            principal = await get_current_user(token, db)
+        except HTTPException as e:
+            await websocket.close(code=CLOSE_UNAUTHORIZED, reason=e.detail)
+            return None
+    # Verified by get_current_user; the socket is closed once it expires
+    return LivePreviewSession(websocket, principal, jwt.get_unverified_claims(token).get("exp"))
+
+
+@router.websocket("/predict-risk/live")
+async def live_preview(websocket: WebSocket):
+    # Slider previews over one socket: authenticate once, then stream
+    # {"type": "preview", "id": ..., <HealthInput fields>} and get back
+    # {"type": "prediction", "id": ..., <PredictionResult fields>} for the
+    # latest one. {"type": "save", ...} stores a health record, as
+    # POST /predict-risk does, and is answered with "saved".
+    await websocket.accept()
+    if live_stats.open >= LIVE_MAX_CONNECTIONS:
+        live_stats.refused += 1
+        await websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason="Too many live connections")
+        return
+
+    live_stats.open += 1
+    live_stats.peak = max(live_stats.peak, live_stats.open)
+    session = evaluator = None
+    try:
+        session = await authenticate(websocket)
+        if session is None:
+            return
+        await session.send({"type": "ready", "user_id": str(session.principal["_id"])})
+        evaluator = asyncio.create_task(session.evaluate())
+        await session.receive()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        try:
+            if evaluator is not None:
+                await session.finish(evaluator)
+        finally:
+            live_stats.open -= 1
@@ -0,0 +1,169 @@
+import asyncio
+import datetime
+import json
+import logging
+import os
+import time
+
+from fastapi import HTTPException, status
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from models.domain import RuleBaseDB
+
+logger = logging.getLogger(__name__)
+
+# How often each process checks the rule_bases table for a rule base
+# activated by another process (or instance). Predictions keep being served
+# by the previous rule base for at most this long after a swap.
+RULE_BASE_REFRESH_SECONDS = float(os.getenv("RULE_BASE_REFRESH_SECONDS", "30"))
+# rule_bases.document is a TEXT column
+MAX_DOCUMENT_BYTES = 65535
+
+_last_sync = None
+# Bumped by every swap, so a background switch that finishes after a newer
+# activation doesn't undo it
+_generation = 0
+_switch_task = None
+
+
+def rule_base_summary(engine):
+    return {
+        "version": engine.version,
+        "description": engine.description,
+        "fingerprint": engine.rule_base_fingerprint,
+        "rules": len(engine.spec["rules"]),
+    }
+
+
+def _compile(document):
+    # Everything slow about a swap happens here, off the event loop and
+    # before the swap: compiling and, in lut mode, tabulating the rule base
+    from fuzzy_engine import ENGINE_MODE, CompiledFuzzyEngine
+
+    engine = CompiledFuzzyEngine(document)
+    if ENGINE_MODE == "lut":
+        from risk_lut import get_lut
+        get_lut(engine)
+    return engine
+
+
+async def activate_rule_base(db: AsyncSession, document, admin_id=None):
+    """Validate, store and activate a rule base document.
+
+    Raises RuleBaseError for an invalid document and a 409 if its version
+    is already taken by a different rule base. Returns the new engine.
+    """
+    global _last_sync, _generation
+    from fuzzy_engine import RuleBaseError, get_engine, install_engine
+
+    text = json.dumps(document)
+    if len(text.encode("utf-8")) > MAX_DOCUMENT_BYTES:
+        raise RuleBaseError(f"Rule base document is larger than {MAX_DOCUMENT_BYTES} bytes")
+    engine = await asyncio.to_thread(_compile, document)
+
+    stored = await db.get(RuleBaseDB, engine.version)
+    if stored is None:
+        db.add(RuleBaseDB(version=engine.version, fingerprint=engine.rule_base_fingerprint, document=text, created_by=admin_id))
+    elif stored.fingerprint != engine.rule_base_fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Rule base version {engine.version} already exists with different content"
+        )
+    await _store_live(db, engine.version)
+    # Exactly one active row; the UPDATE locks the rows it flips, so
+    # concurrent activations serialize and the last commit wins
+    await db.execute(
+        update(RuleBaseDB).where(RuleBaseDB.active.is_(True), RuleBaseDB.version != engine.version).values(active=False)
+    )
+    await db.execute(
+        update(RuleBaseDB).where(RuleBaseDB.version == engine.version)
+        .values(active=True, activated_at=datetime.datetime.utcnow())
+    )
+    await db.commit()
+
+    previous = get_engine()
+    install_engine(engine)
+    _generation += 1
+    _last_sync = time.monotonic()
+    logger.info(f"Rule base {previous.version} -> {engine.version} activated by {admin_id}")
+    return engine
+
+
+async def _store_live(db: AsyncSession, replacing):
+    # The rule base being replaced may never have been stored, e.g. the
+    # bundled rules/default.json on the first swap; store it so a rollback
+    # to it works like to any other version
+    from fuzzy_engine import get_engine
+
+    live = get_engine()
+    if live.version == replacing or await db.get(RuleBaseDB, live.version) is not None:
+        return
+    db.add(RuleBaseDB(version=live.version, fingerprint=live.rule_base_fingerprint, document=json.dumps(live.document)))
+
+
+async def activate_stored_rule_base(db: AsyncSession, version, admin_id=None):
+    # Re-activate a version stored earlier, e.g. to roll back a swap
+    from fuzzy_engine import RULE_BASE_PATH, load_rule_base
+
+    stored = await db.get(RuleBaseDB, version)
+    if stored is not None:
+        return await activate_rule_base(db, json.loads(stored.document), admin_id)
+    # Databases swapped before the bundled rule base was stored on a swap
+    bundled = await asyncio.to_thread(load_rule_base, RULE_BASE_PATH)
+    if bundled.get("version") != version:
+        raise HTTPException(status_code=404, detail="Rule base version not found")
+    return await activate_rule_base(db, bundled, admin_id)
+
+
+async def _switch(document, generation):
+    global _generation
+    from fuzzy_engine import RuleBaseError, get_engine, install_engine
+
+    try:
+        engine = await asyncio.to_thread(_compile, document)
+    except RuleBaseError as e:
+        logger.error(f"Active rule base does not compile, staying on {get_engine().version}: {e}")
+        return
+    if generation == _generation:
+        install_engine(engine)
+        _generation += 1
+
+
+async def sync_rule_base(db: AsyncSession):
+    """Follow the rule base active in the database if another process changed it.
+
+    Costs one query per RULE_BASE_REFRESH_SECONDS per process; every other
+    call returns straight away. The new rule base is compiled in the
+    background, requests keep using the current one until it's installed.
+    """
+    global _last_sync, _switch_task
+    now = time.monotonic()
+    if _last_sync is not None and now - _last_sync < RULE_BASE_REFRESH_SECONDS:
+        return
+    first_check = _last_sync is None
+    _last_sync = now
+
+    from fuzzy_engine import get_engine
+
+    result = await db.execute(select(RuleBaseDB.fingerprint, RuleBaseDB.document).where(RuleBaseDB.active.is_(True)))
+    row = result.first()
+    if row is None or row.fingerprint == get_engine().rule_base_fingerprint:
+        return
+    if first_check:
+        # Nothing has been scored in this process yet; wait rather than
+        # serve the bundled rule base in the meantime
+        await _switch(json.loads(row.document), _generation)
+    elif _switch_task is None or _switch_task.done():
+        _switch_task = asyncio.create_task(_switch(json.loads(row.document), _generation))
+
+
+async def list_rule_bases(db: AsyncSession):
+    result = await db.execute(
+        select(
+            RuleBaseDB.version, RuleBaseDB.fingerprint, RuleBaseDB.active,
+            RuleBaseDB.created_by, RuleBaseDB.created_at, RuleBaseDB.activated_at
+        ).order_by(RuleBaseDB.created_at.desc())
+    )
+    return [dict(row._mapping) for row in result]
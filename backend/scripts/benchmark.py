@@ -0,0 +1,418 @@
+"""Benchmark the fuzzy engine and the API hot paths.
+
+Startup: a serverless (VERCEL=1) cold start in a fresh interpreter, timing
+the import of main, the startup hooks and the first /api/health and
+/api/login responses, plus the slowest imports and which heavy modules
+(NumPy, pyarrow, ...) got loaded along the way.
+
+Engine: cold start (fresh interpreter: import, compile, first call), single
+call latency and throughput over a random input grid, both one call at a
+time and as one vectorized batch.
+
+Serialization: per-row cost of building a 10k-row /api/history and
+/api/admin/all-users response, the old way (model objects validated and
+dumped again through response_model) and the current one (rows straight to
+JSON via serialization.json_rows).
+
+API: /api/predict-risk, /api/history, /api/login and /api/admin/analytics
+driven in-process through httpx's ASGI transport against a throwaway SQLite
+database (needs aiosqlite and httpx), so no MySQL or network is involved.
+
+Results are written as JSON. Pass a previous run as --baseline to fail
+(exit 1) when any latency grows, or any throughput drops, by more than
+--threshold.
+
+    python scripts/benchmark.py --output bench.json
+    python scripts/benchmark.py --baseline bench.json --threshold 0.15
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+COLD_START_SNIPPET = """
+import time
+start = time.perf_counter()
+from fuzzy_engine import get_health_prediction
+get_health_prediction(24.0, 75.0, 7.0, 5.0)
+print(time.perf_counter() - start)
+"""
+
+
+# Runs in a fresh interpreter configured like a Vercel cold start and prints
+# its timings as JSON
+COLD_START_APP_SNIPPET = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def run():
+    import httpx
+    timings = {"import": imported - start}
+    async with main.app.router.lifespan_context(main.app):
+        timings["startup"] = time.perf_counter() - imported
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.get("/api/health")
+            timings["first_health"] = time.perf_counter() - start
+            heavy = [m for m in ("numpy", "skfuzzy", "scipy", "pyarrow") if m in sys.modules]
+            await client.post("/api/login", json={"email": "nobody@example.com", "password": "x"})
+            timings["first_login"] = time.perf_counter() - start
+    print(json.dumps({"timings": timings, "heavy_modules": heavy}))
+
+asyncio.run(run())
+"""
+
+HEAVY_IMPORT_COUNT = 15
+SERIALIZATION_ROWS = 10000
+
+
+def summarize(latencies, wall):
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))]
+
+    return {
+        "count": len(latencies),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 4),
+        "p50_ms": round(percentile(50) * 1000, 4),
+        "p95_ms": round(percentile(95) * 1000, 4),
+        "p99_ms": round(percentile(99) * 1000, 4),
+        "ops_per_sec": round(len(latencies) / wall, 1) if wall > 0 else 0.0,
+    }
+
+
+def random_inputs(rng, n):
+    # Same ranges as HealthInput, at the 0.1 step the sliders send
+    return [
+        (round(rng.uniform(10, 40), 1), round(rng.uniform(40, 180), 1),
+         round(rng.uniform(0, 12), 1), round(rng.uniform(0, 7), 1))
+        for _ in range(n)
+    ]
+
+
+def bench_startup(args, workdir):
+    env = dict(os.environ, VERCEL="1",
+               MYSQL_URL=f"sqlite+aiosqlite:///{os.path.join(workdir, 'startup.db')}")
+    runs = []
+    for _ in range(args.cold_runs):
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_START_APP_SNIPPET], cwd=BACKEND_DIR, env=env,
+            capture_output=True, text=True, check=True
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    results = {}
+    for name in ("import", "startup", "first_health", "first_login"):
+        values = [run["timings"][name] for run in runs]
+        results[f"startup_{name}"] = summarize(values, sum(values))
+
+    # Self-reported per-module import times (microseconds) of one more run
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    ).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, module = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        imports.append({"module": module, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    slowest = sorted(imports, key=lambda entry: -entry["self_ms"])[:HEAVY_IMPORT_COUNT]
+    return results, {"heavy_modules_loaded": runs[-1]["heavy_modules"], "slowest_imports": slowest}
+
+
+def bench_engine(args, rng):
+    import fuzzy_engine
+
+    results = {}
+
+    cold = []
+    for _ in range(args.cold_runs):
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_START_SNIPPET], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout
+        cold.append(float(output.strip().splitlines()[-1]))
+    results["engine_cold_start"] = summarize(cold, sum(cold))
+
+    start = time.perf_counter()
+    fuzzy_engine._engine = None
+    fuzzy_engine.get_engine()
+    results["engine_compile"] = summarize([time.perf_counter() - start], time.perf_counter() - start)
+
+    inputs = random_inputs(rng, args.engine_calls)
+    fuzzy_engine.get_health_prediction(*inputs[0])
+    latencies = []
+    wall_start = time.perf_counter()
+    for values in inputs:
+        start = time.perf_counter()
+        fuzzy_engine.get_health_prediction(*values)
+        latencies.append(time.perf_counter() - start)
+    results["engine_single_call"] = summarize(latencies, time.perf_counter() - wall_start)
+
+    grid = random_inputs(rng, args.engine_grid)
+    columns = [list(column) for column in zip(*grid)]
+    latencies = []
+    wall_start = time.perf_counter()
+    for _ in range(args.engine_batches):
+        start = time.perf_counter()
+        fuzzy_engine.get_health_predictions(*columns)
+        latencies.append(time.perf_counter() - start)
+    wall = time.perf_counter() - wall_start
+    batch = summarize(latencies, wall)
+    batch["inputs_per_sec"] = round(len(grid) * len(latencies) / wall, 1)
+    results["engine_batch"] = batch
+
+    return results
+
+
+def bench_serialization(args, rng):
+    import uuid
+    from typing import List
+    from pydantic import TypeAdapter
+    from models.health_record import HealthRecord
+    from models.user import UserResponse
+    from routes.health import HISTORY_FIELDS
+    from routes.admin import USER_FIELDS
+    from serialization import json_rows
+
+    now = datetime.datetime.utcnow()
+    history_rows = [
+        tuple({
+            "id": str(uuid.uuid4()), "user_id": str(uuid.uuid4()), "timestamp": now,
+            "bmi": bmi, "heart_rate": hr, "sleep_hours": sleep, "exercise_level": exercise,
+            "risk_score": round(rng.uniform(0, 100), 2), "risk_level": "MEDIUM",
+            "recommendation": "Moderate risk. Consider improving sleep and exercise habits.",
+            "rule_base_version": "1.0.0",
+        }[field] for field in HISTORY_FIELDS)
+        for bmi, hr, sleep, exercise in random_inputs(rng, SERIALIZATION_ROWS)
+    ]
+    user_rows = [
+        tuple({
+            "id": str(uuid.uuid4()), "name": f"User {i}", "email": f"user{i}@example.com",
+            "age": 20 + i % 60, "gender": "other", "role": "user",
+        }[field] for field in USER_FIELDS)
+        for i in range(SERIALIZATION_ROWS)
+    ]
+    history_adapter = TypeAdapter(List[HealthRecord])
+    users_adapter = TypeAdapter(List[UserResponse])
+
+    def history_before():
+        # Row mappings validated and dumped by response_model
+        return history_adapter.dump_json(history_adapter.validate_python(
+            [dict(zip(HISTORY_FIELDS, row)) for row in history_rows]
+        ))
+
+    def users_before():
+        # UserResponse built per row, then validated and dumped again by response_model
+        users = [UserResponse(**dict(zip(USER_FIELDS, row))) for row in user_rows]
+        return users_adapter.dump_json(users_adapter.validate_python(users))
+
+    cases = {
+        "serialization_history_before": history_before,
+        "serialization_history": lambda: json_rows(HISTORY_FIELDS, history_rows).body,
+        "serialization_users_before": users_before,
+        "serialization_users": lambda: json_rows(USER_FIELDS, user_rows).body,
+    }
+    assert cases["serialization_history"]() == history_before()
+
+    results = {}
+    for name, build in cases.items():
+        build()
+        latencies = []
+        wall_start = time.perf_counter()
+        for _ in range(args.serialization_repeats):
+            start = time.perf_counter()
+            build()
+            latencies.append(time.perf_counter() - start)
+        summary = summarize(latencies, time.perf_counter() - wall_start)
+        summary["per_row_us"] = round(summary["p50_ms"] * 1000 / SERIALIZATION_ROWS, 3)
+        results[name] = summary
+    return results
+
+
+async def drive(send, requests, concurrency):
+    """Run send(i) for every i with at most `concurrency` in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await send(i)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return summarize(latencies, time.perf_counter() - wall_start)
+
+
+async def bench_api(args, rng):
+    import httpx
+    from main import app
+
+    results = {}
+    credentials = {"email": "bench@example.com", "password": "bench-password"}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # First registered user is the admin, so one account covers every endpoint
+            response = await client.post("/api/register", json={
+                "name": "Bench", "age": 40, "gender": "other", **credentials
+            })
+            response.raise_for_status()
+            response = await client.post("/api/login", json=credentials)
+            response.raise_for_status()
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+            for start in range(0, args.history_records, 1000):
+                size = min(1000, args.history_records - start)
+                body = [
+                    dict(zip(("bmi", "heart_rate", "sleep_hours", "exercise_level"), values))
+                    for values in random_inputs(rng, size)
+                ]
+                (await client.post("/api/predict-risk/batch", json=body, headers=headers)).raise_for_status()
+
+            inputs = [
+                dict(zip(("bmi", "heart_rate", "sleep_hours", "exercise_level"), values))
+                for values in random_inputs(rng, args.requests)
+            ]
+            endpoints = {
+                "api_predict_risk": (args.requests, lambda i: client.post(
+                    "/api/predict-risk", json=inputs[i], headers=headers)),
+                "api_history": (args.requests, lambda i: client.get("/api/history", headers=headers)),
+                "api_login": (args.login_requests, lambda i: client.post("/api/login", json=credentials)),
+                "api_admin_analytics": (args.requests, lambda i: client.get(
+                    "/api/admin/analytics", headers=headers)),
+            }
+            for name, (requests, send) in endpoints.items():
+                # Warm up caches, pools and workers before timing
+                for i in range(min(5, requests)):
+                    (await send(i)).raise_for_status()
+                results[name] = await drive(send, requests, args.concurrency)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return the metrics that got worse than the baseline by more than threshold."""
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            before = baseline.get(name, {}).get(metric)
+            if not before or metric == "count":
+                continue
+            if metric.endswith(("_ms", "_us")):
+                change = value / before - 1
+            elif metric.endswith("_per_sec"):
+                change = before / value - 1 if value else float("inf")
+            else:
+                continue
+            if change > threshold:
+                regressions.append({"benchmark": name, "metric": metric, "baseline": before,
+                                    "current": value, "change": round(change, 4)})
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", choices=("startup", "engine", "serialization", "api"),
+                        help="run one group of benchmarks")
+    parser.add_argument("--output", help="write the JSON results here (default: stdout)")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed relative slowdown before a metric counts as a regression")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cold-runs", type=int, default=3)
+    parser.add_argument("--engine-calls", type=int, default=2000)
+    parser.add_argument("--engine-grid", type=int, default=10000)
+    parser.add_argument("--engine-batches", type=int, default=10)
+    parser.add_argument("--serialization-repeats", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--login-requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--history-records", type=int, default=1000)
+    args = parser.parse_args()
+
+    # Point the app at a fresh SQLite file before database.py is imported
+    workdir = tempfile.mkdtemp(prefix="smart_health_bench_")
+    os.environ["MYSQL_URL"] = f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    # Request logs and fallback warnings would otherwise dominate the timings
+    logging.disable(logging.WARNING)
+
+    rng = random.Random(args.seed)
+    results = {}
+    startup_details = None
+    if args.only in (None, "startup"):
+        startup_results, startup_details = bench_startup(args, workdir)
+        results.update(startup_results)
+    if args.only in (None, "engine"):
+        results.update(bench_engine(args, rng))
+    if args.only in (None, "serialization"):
+        results.update(bench_serialization(args, rng))
+    if args.only in (None, "api"):
+        results.update(asyncio.run(bench_api(args, rng)))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "settings": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        },
+        "results": results,
+    }
+    if startup_details:
+        report["startup"] = startup_details
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.threshold)
+        report["regressions"] = regressions
+        for r in regressions:
+            print(f"REGRESSION {r['benchmark']}.{r['metric']}: {r['baseline']} -> {r['current']} "
+                  f"(+{r['change']:.1%})", file=sys.stderr)
+        exit_code = 1 if regressions else 0
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for name, metrics in results.items():
+        print(f"{name:24} p50 {metrics['p50_ms']:>10.3f} ms  p95 {metrics['p95_ms']:>10.3f} ms  "
+              f"{metrics['ops_per_sec']:>10.1f} ops/s", file=sys.stderr)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
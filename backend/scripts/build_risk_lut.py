@@ -0,0 +1,46 @@
+"""Build the risk lookup table for one or more grid resolutions.
+
+Reports build time, memory and the interpolation error against the exact
+engine for each resolution, and leaves the table in the LUT cache directory
+so FUZZY_ENGINE_MODE=lut workers can map it instead of rebuilding. With
+--artifact the table goes to the artifacts directory shipped with the code
+instead, for serverless deploys whose cache starts out empty.
+
+    python scripts/build_risk_lut.py 16,36,13,8 31,71,25,15
+    python scripts/build_risk_lut.py --artifact
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fuzzy_engine import get_engine
+from risk_lut import LUT_ARTIFACT_DIR, LUT_CACHE_DIR, LUT_POINTS, RiskLookupTable, parse_points
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("points", nargs="*", default=[LUT_POINTS],
+                        help="grid points per input as bmi,heart_rate,sleep_hours,exercise_level")
+    parser.add_argument("--cache-dir", default=LUT_CACHE_DIR)
+    parser.add_argument("--artifact", action="store_true", help=f"save to {LUT_ARTIFACT_DIR} instead of the cache")
+    args = parser.parse_args()
+    output_dir = LUT_ARTIFACT_DIR if args.artifact else args.cache_dir
+
+    engine = get_engine()
+    for points in map(parse_points, args.points):
+        start = time.perf_counter()
+        lut = RiskLookupTable.build(engine, points)
+        elapsed = time.perf_counter() - start
+        max_error, mean_error = lut.measure_error()
+        print(f"{'x'.join(map(str, points))}: {elapsed:.1f}s, {lut.nbytes / 1e6:.1f} MB, "
+              f"max error {max_error:.4f}, mean error {mean_error:.4f}")
+        path = RiskLookupTable.cache_path(engine, points, output_dir)
+        lut.save(path)
+        print(f"  saved {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Compare the compiled NumPy fuzzy engine against scikit-fuzzy.
+
+Builds the original skfuzzy control system from the same rule base, scores a
+grid of inputs plus --samples seeded random fractional ones (which land
+between the universe samples, where the grid rarely does) through both and
+reports the largest risk score difference. Exits non-zero if it exceeds
+fuzzy_engine.PARITY_TOLERANCE.
+
+    python scripts/check_engine_parity.py [--steps 7] [--samples 2000] [--seed 42] [--rule-base rules/default.json]
+"""
+import argparse
+import itertools
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import skfuzzy as fuzzy
+from skfuzzy import control as ctrl
+
+import fuzzy_engine
+
+
+def build_reference_simulation(rule_base):
+    variables = {}
+    for name in fuzzy_engine.INPUT_ORDER:
+        spec = rule_base["inputs"][name]
+        variables[name] = ctrl.Antecedent(np.arange(*spec["universe"]), name)
+        for term, (kind, params) in spec["terms"].items():
+            variables[name][term] = getattr(fuzzy, kind)(variables[name].universe, params)
+
+    output = rule_base["output"]
+    consequent = ctrl.Consequent(np.arange(*output["universe"]), output["name"])
+    for term, (kind, params) in output["terms"].items():
+        consequent[term] = getattr(fuzzy, kind)(consequent.universe, params)
+
+    rules = []
+    for op, antecedents, target in rule_base["rules"]:
+        terms = [variables[name][term] for name, term in antecedents]
+        condition = terms[0]
+        for term in terms[1:]:
+            condition = condition | term if op == "or" else condition & term
+        rules.append(ctrl.Rule(condition, consequent[target]))
+
+    return ctrl.ControlSystemSimulation(ctrl.ControlSystem(rules)), output["name"]
+
+
+def reference_score(sim, output_name, inputs):
+    for name, value in zip(fuzzy_engine.INPUT_ORDER, inputs):
+        sim.input[name] = value
+    try:
+        sim.compute()
+        return sim.output[output_name]
+    except Exception:
+        return float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=7, help="grid points per input")
+    parser.add_argument("--samples", type=int, default=2000, help="random fractional inputs")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rule-base", default=fuzzy_engine.RULE_BASE_PATH, help="rule base JSON file")
+    args = parser.parse_args()
+
+    # scikit-fuzzy samples the universes, so compare the mode that does the same
+    engine = fuzzy_engine.CompiledFuzzyEngine(fuzzy_engine.load_rule_base(args.rule_base), inference="sampled")
+    print(f"rule base: {args.rule_base} (version {engine.version})")
+
+    axes = []
+    for name in fuzzy_engine.INPUT_ORDER:
+        start, stop, step = engine.spec["inputs"][name]["universe"]
+        axes.append(np.linspace(start, stop - step, args.steps))
+    grid = np.array(list(itertools.product(*axes)))
+    rng = np.random.default_rng(args.seed)
+    samples = np.column_stack([rng.uniform(universe[0], universe[-1], args.samples) for universe in engine.universes])
+    inputs = np.vstack([grid, samples])
+
+    sim, output_name = build_reference_simulation(engine.spec)
+    expected = np.array([reference_score(sim, output_name, row) for row in inputs])
+    actual = engine.evaluate(*inputs.T)
+
+    fallback_mismatch = int((np.isnan(expected) != np.isnan(actual)).sum())
+    both = ~np.isnan(expected) & ~np.isnan(actual)
+    error = np.abs(expected[both] - actual[both])
+    worst = float(error.max()) if error.size else 0.0
+
+    if error.size:
+        row = inputs[both][error.argmax()]
+        print("worst input: " + ", ".join(f"{name}={value:.3f}" for name, value in zip(fuzzy_engine.INPUT_ORDER, row)))
+    print(f"inputs: {len(grid)} grid + {len(samples)} random  fallback mismatches: {fallback_mismatch}")
+    print(f"max |error|: {worst:.6f}  mean |error|: {float(error.mean()) if error.size else 0.0:.6f}"
+          f"  tolerance: {fuzzy_engine.PARITY_TOLERANCE}")
+    if fallback_mismatch or worst > fuzzy_engine.PARITY_TOLERANCE:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
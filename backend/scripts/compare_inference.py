@@ -0,0 +1,105 @@
+"""Compare the engine's sampled and analytic inference modes.
+
+Defuzzification: feeds both modes the same output cut levels and reports
+how far their centroids differ from each other and from a dense numerical
+reference. Exits non-zero if |analytic - sampled| exceeds --tolerance.
+
+End to end: scores random inputs, at full float precision rather than on
+the integer universes, through both modes and reports the score
+differences, risk level changes and inputs only one mode finds a rule for.
+These also include the membership differences between interpolating the
+sampled universes and evaluating the functions exactly, so they are
+reported but not checked. Timings are per mode, batch and single input.
+
+    python scripts/compare_inference.py [--inputs 20000] [--tolerance 0.05] [--rule-base rules/default.json]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import fuzzy_engine
+
+
+def dense_reference(engine, cuts, points):
+    # Centroid of the exact clipped and aggregated output, integrated on a
+    # grid of `points` samples: converges on the analytic result as points grows
+    x = np.linspace(*engine.output_range, points)
+    terms = np.vstack([fuzzy_engine._membership(x, kind, params) for kind, params in engine.spec["output"]["terms"].values()])
+    scores = np.empty(len(cuts))
+    for start in range(0, len(cuts), 32):
+        aggregated = np.minimum(cuts[start:start + 32, :, None], terms).max(axis=1)
+        area = aggregated.sum(axis=1)
+        scores[start:start + 32] = (aggregated * x).sum(axis=1) / np.where(area > 0, area, np.nan)
+    return scores
+
+
+def timed(engine, columns, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        engine.evaluate(*columns)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--inputs", type=int, default=20000, help="random inputs to compare")
+    parser.add_argument("--reference-inputs", type=int, default=500, help="inputs also scored against the dense reference")
+    parser.add_argument("--reference-points", type=int, default=100001, help="output samples of the dense reference")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="largest acceptable |analytic - sampled| centroid for the same cuts")
+    parser.add_argument("--rule-base", default=fuzzy_engine.RULE_BASE_PATH, help="rule base JSON file")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    document = fuzzy_engine.load_rule_base(args.rule_base)
+    sampled = fuzzy_engine.CompiledFuzzyEngine(document, inference="sampled")
+    analytic = fuzzy_engine.CompiledFuzzyEngine(document, inference="analytic")
+    print(f"rule base: {args.rule_base} (version {sampled.version})")
+
+    rng = np.random.default_rng(args.seed)
+    columns = [rng.uniform(universe[0], universe[-1], args.inputs) for universe in sampled.universes]
+
+    # Exact memberships at the input values, the same cuts for every mode
+    subset = [column[:args.reference_inputs] for column in columns]
+    cuts = analytic.activations(analytic.rule_strengths(analytic.fuzzify(*subset)))
+    reference = dense_reference(analytic, cuts, args.reference_points)
+    centroids = {name: engine.defuzzify(cuts) for name, engine in (("sampled", sampled), ("analytic", analytic))}
+    worst = float(np.nanmax(np.abs(centroids["analytic"] - centroids["sampled"]), initial=0.0))
+    print(f"defuzzification, {len(cuts)} inputs: max |analytic - sampled| {worst:.6f}  tolerance: {args.tolerance}")
+    for name, centroid in centroids.items():
+        error = np.abs(centroid - reference)
+        print(f"{name:>10} vs reference ({args.reference_points} points): max |error| {np.nanmax(error, initial=0.0):.6f}"
+              f"  mean {np.nanmean(error):.6f}")
+
+    expected = sampled.evaluate(*columns)
+    actual = analytic.evaluate(*columns)
+    fallback_mismatch = int((np.isnan(expected) != np.isnan(actual)).sum())
+    both = ~np.isnan(expected) & ~np.isnan(actual)
+    difference = np.abs(actual[both] - expected[both])
+    level_changes = sum(
+        fuzzy_engine.classify_risk(a)[0] != fuzzy_engine.classify_risk(s)[0]
+        for a, s in zip(actual[both].tolist(), expected[both].tolist())
+    )
+    print(f"end to end, {args.inputs} inputs: max |analytic - sampled| {float(difference.max(initial=0.0)):.6f}"
+          f"  mean {float(difference.mean()) if difference.size else 0.0:.6f}")
+    print(f"{'':>10} risk level changes: {level_changes}  no rule fired in one mode only: {fallback_mismatch}")
+
+    single = [column[:1] for column in columns]
+    for name, engine in (("sampled", sampled), ("analytic", analytic)):
+        batch = timed(engine, columns, 5)
+        one = timed(engine, single, 200)
+        print(f"{name:>10}: batch {batch * 1e3:.1f} ms ({args.inputs / batch:,.0f} inputs/s)  single {one * 1e6:.0f} us")
+
+    if worst > args.tolerance:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
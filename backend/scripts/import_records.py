@@ -0,0 +1,72 @@
+"""Stream a CSV or NDJSON file of health inputs into health_records.
+
+Rows are validated against the HealthInput bounds, scored chunk by chunk
+with the vectorized fuzzy engine and bulk-inserted one chunk per
+transaction. Rejected rows go to a quarantine NDJSON file (or are only
+counted with --on-invalid skip). An interrupted import is resumed by
+passing the job id it printed.
+
+    python scripts/import_records.py legacy.csv --user-id <uuid>
+    python scripts/import_records.py legacy.csv --job-id <job id>
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Score in this process; there is no event loop to keep responsive
+os.environ.setdefault("INFERENCE_EXECUTOR", "inline")
+
+from database import AsyncSessionLocal, engine
+from record_import import IMPORT_CHUNK_SIZE, RecordImportError, detect_format, iter_rows, import_records
+
+
+async def run(args):
+    fmt = detect_format(args.path, args.format)
+    quarantine_path = args.quarantine_file or f"{args.path}.rejected.ndjson"
+    source = os.path.basename(args.path)
+
+    with open(args.path, encoding="utf-8", newline="") as f, \
+            open(quarantine_path, "a", encoding="utf-8") as rejected:
+        def quarantine(row, error):
+            rejected.write(json.dumps({"row": row, **error}, default=str) + "\n")
+
+        async with AsyncSessionLocal() as db:
+            report = await import_records(
+                db, iter_rows(f, fmt), source,
+                job_id=args.job_id,
+                default_user_id=args.user_id,
+                on_invalid=args.on_invalid,
+                quarantine=quarantine,
+                chunk_size=args.chunk_size
+            )
+    await engine.dispose()
+
+    if report["rows_rejected"] and args.on_invalid == "quarantine":
+        report["quarantine_file"] = quarantine_path
+    report.pop("errors")
+    print(json.dumps(report, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="detected from the extension if omitted")
+    parser.add_argument("--user-id", help="owner for rows without a user_id column")
+    parser.add_argument("--job-id", help="resume this import job")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    parser.add_argument("--on-invalid", choices=["quarantine", "skip"], default="quarantine")
+    parser.add_argument("--quarantine-file", help="defaults to <path>.rejected.ndjson")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args))
+    except RecordImportError as e:
+        sys.exit(f"error: {e}")
+
+
+if __name__ == "__main__":
+    main()
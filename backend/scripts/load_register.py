@@ -0,0 +1,175 @@
+"""Load test /api/register: concurrent sign-ups against a large users table.
+
+Race: fires --race-registrations sign-ups at once on an empty users table
+and checks that exactly one of them became the admin.
+
+Load: bulk-inserts --users existing users, then registers --registrations
+new ones with at most --concurrency in flight. A --duplicates share of them
+reuse an existing email and must get a 400. Reports latencies for each kind
+and checks the user count and that there is still one admin.
+
+Runs in-process through httpx's ASGI transport against a throwaway SQLite
+database, or against --database-url, which must point at an empty scratch
+database. Passwords are hashed with --bcrypt-rounds (default 4) so the hash
+doesn't drown out the database work being measured. Exits 1 if a check fails.
+
+    python scripts/load_register.py [--users 100000] [--registrations 500] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SEED_CHUNK = 10000
+
+
+def summarize(latencies, wall):
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))]
+
+    if not latencies:
+        return {"count": 0}
+    return {
+        "count": len(latencies),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(percentile(50) * 1000, 3),
+        "p95_ms": round(percentile(95) * 1000, 3),
+        "p99_ms": round(percentile(99) * 1000, 3),
+        "ops_per_sec": round(len(latencies) / wall, 1) if wall > 0 else 0.0,
+    }
+
+
+def signup(email):
+    return {"name": "Load", "email": email, "age": 30, "gender": "other", "password": "load-test-password"}
+
+
+async def count_users(role=None):
+    from sqlalchemy import func, select
+    from database import AsyncSessionLocal
+    from models.domain import UserDB
+
+    query = select(func.count()).select_from(UserDB)
+    if role is not None:
+        query = query.where(UserDB.role == role)
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(query)).scalar()
+
+
+async def seed_users(count, password):
+    # Plain multi-row inserts with one shared hash: the table only has to be big
+    from sqlalchemy import insert
+    from database import AsyncSessionLocal
+    from models.domain import UserDB
+
+    async with AsyncSessionLocal() as db:
+        for start in range(0, count, SEED_CHUNK):
+            await db.execute(insert(UserDB), [
+                {"id": str(uuid.uuid4()), "name": "Seed", "email": f"seed{i}@example.com", "age": 30,
+                 "gender": "other", "password": password, "role": "user"}
+                for i in range(start, min(count, start + SEED_CHUNK))
+            ])
+            await db.commit()
+
+
+async def register_all(client, emails, concurrency):
+    """POST every email to /api/register; returns (status, latency) per email."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(email):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/api/register", json=signup(email))
+            return response.status_code, time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(email) for email in emails))
+    return results, time.perf_counter() - start
+
+
+async def run(args):
+    import httpx
+    from main import app
+    from routes.auth import get_password_hash
+
+    failures = []
+    async with app.router.lifespan_context(app):
+        if await count_users():
+            sys.exit("The users table is not empty; point --database-url at a scratch database")
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=None) as client:
+            emails = [f"race{i}@example.com" for i in range(args.race_registrations)]
+            results, _ = await register_all(client, emails, len(emails))
+            statuses = sorted({status for status, _ in results})
+            admins = await count_users("admin")
+            print(f"race: {len(emails)} concurrent first sign-ups, statuses {statuses}, admins {admins}")
+            if statuses != [200] or admins != 1:
+                failures.append("first-admin race")
+
+            start = time.perf_counter()
+            await seed_users(args.users, get_password_hash("seed-password"))
+            print(f"seeded {args.users} users in {time.perf_counter() - start:.1f} s")
+
+            rng = random.Random(args.seed)
+            emails = [
+                f"seed{rng.randrange(args.users)}@example.com" if args.users and rng.random() < args.duplicates
+                else f"load{i}@example.com"
+                for i in range(args.registrations)
+            ]
+            results, wall = await register_all(client, emails, args.concurrency)
+            by_kind = {"new": [], "duplicate": []}
+            for email, (status, latency) in zip(emails, results):
+                kind = "duplicate" if email.startswith("seed") else "new"
+                if status != (400 if kind == "duplicate" else 200):
+                    failures.append(f"{kind} {email}: HTTP {status}")
+                by_kind[kind].append(latency)
+            for kind, latencies in by_kind.items():
+                summary = summarize(latencies, wall)
+                print(f"{kind:>10}: " + "  ".join(f"{key} {value}" for key, value in summary.items()))
+
+        expected = args.race_registrations + args.users + len(by_kind["new"])
+        users, admins = await count_users(), await count_users("admin")
+        print(f"users: {users} (expected {expected})  admins: {admins}")
+        if users != expected or admins != 1:
+            failures.append("user counts")
+
+    for failure in failures[:20]:
+        print(f"FAILED {failure}", file=sys.stderr)
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000, help="existing users to seed before the load")
+    parser.add_argument("--registrations", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duplicates", type=float, default=0.1, help="share of sign-ups reusing a seeded email")
+    parser.add_argument("--race-registrations", type=int, default=20)
+    parser.add_argument("--bcrypt-rounds", type=int, default=4)
+    parser.add_argument("--database-url", help="empty scratch database (default: a throwaway SQLite file)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # Configure the app before database.py and routes.auth are imported
+    workdir = tempfile.mkdtemp(prefix="smart_health_load_")
+    os.environ["MYSQL_URL"] = args.database_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'load.db')}"
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    os.environ["AUTO_MIGRATE"] = "true"
+    os.environ.setdefault("SECRET_KEY", "load-test")
+    logging.disable(logging.WARNING)
+
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
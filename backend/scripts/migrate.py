@@ -0,0 +1,24 @@
+"""Create missing tables and indexes in the configured database.
+
+Run once per deploy (the app only does this at startup when AUTO_MIGRATE is
+on, which it isn't on Vercel):
+
+    MYSQL_URL=mysql://... python scripts/migrate.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import engine
+from migrations import migrate
+
+
+async def main():
+    await migrate(engine)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
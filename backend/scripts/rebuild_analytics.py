@@ -0,0 +1,38 @@
+"""Recompute the analytics aggregates from the raw users / health_records tables.
+
+    python scripts/rebuild_analytics.py           # rebuild, then verify
+    python scripts/rebuild_analytics.py --check   # only report drift
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import AsyncSessionLocal, engine
+from analytics import rebuild_aggregates, check_consistency
+
+
+async def run(check_only):
+    async with AsyncSessionLocal() as db:
+        if not check_only:
+            await rebuild_aggregates(db)
+            await db.commit()
+        report = await check_consistency(db)
+    await engine.dispose()
+    print(json.dumps(report, indent=2))
+    return report["consistent"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--check", action="store_true", help="only compare stored aggregates with the raw tables")
+    args = parser.parse_args()
+    if not asyncio.run(run(args.check)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
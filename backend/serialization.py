@@ -0,0 +1,52 @@
+import hashlib
+
+import orjson
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+from metrics import stage
+
+
+class ORJSONResponse(JSONResponse):
+    # orjson writes naive datetimes, floats and strings exactly as Pydantic's
+    # JSON mode does, so clients see the same bytes
+    def render(self, content):
+        return orjson.dumps(content)
+
+
+def json_rows(fields, rows, headers=None):
+    """Serialize result rows straight to a JSON list of objects.
+
+    For list endpoints: fields are the response model's field names, in
+    order, and each row holds the matching columns. Returning the response
+    directly skips FastAPI's response_model validation pass; the
+    response_model on the route still documents the schema.
+    """
+    with stage("serialization"):
+        return ORJSONResponse([dict(zip(fields, row)) for row in rows], headers=headers)
+
+
+# Conditional GET: per-user data, so no shared caches, and browsers must
+# revalidate (If-None-Match) before reusing what they stored
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*version):
+    """Strong ETag for a response that is entirely determined by version."""
+    return '"' + hashlib.blake2b(repr(version).encode("utf-8"), digest_size=12).hexdigest() + '"'
+
+
+def cache_headers(etag, headers=None):
+    return {**(headers or {}), "ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified(request: Request, etag):
+    """A 304 response if the client already holds etag, otherwise None."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    # Weak comparison, as RFC 9110 specifies for If-None-Match
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    if "*" in tags or etag in tags:
+        return Response(status_code=304, headers=cache_headers(etag))
+    return None
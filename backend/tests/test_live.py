@@ -0,0 +1,46 @@
+"""Size limit of live preview messages (routes/live.py)."""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orjson
+import pytest
+
+from routes.live import LIVE_MAX_MESSAGE_BYTES, MessageError, parse_message
+
+# Bytes of {"note":""} around the repeated character
+OVERHEAD = 11
+
+
+def note(char, count):
+    return orjson.dumps({"note": char * count}).decode("utf-8")
+
+
+def most_that_fit(char):
+    return (LIVE_MAX_MESSAGE_BYTES - OVERHEAD) // len(char.encode("utf-8"))
+
+
+@pytest.mark.parametrize("char", ["a", "é", "€", "😀"])
+def test_message_at_the_limit_is_accepted(char):
+    data = note(char, most_that_fit(char))
+    assert LIVE_MAX_MESSAGE_BYTES - len(char.encode("utf-8")) < len(data.encode("utf-8")) <= LIVE_MAX_MESSAGE_BYTES
+    assert parse_message(data)["note"]
+
+
+@pytest.mark.parametrize("char", ["a", "é", "€", "😀"])
+def test_message_one_character_over_the_limit_is_rejected(char):
+    data = note(char, most_that_fit(char) + 1)
+    assert len(data.encode("utf-8")) > LIVE_MAX_MESSAGE_BYTES
+    with pytest.raises(MessageError):
+        parse_message(data)
+
+
+def test_multibyte_text_is_measured_in_bytes():
+    # Well under the limit in characters, over it in bytes
+    data = note("😀", most_that_fit("😀") + 1)
+    assert len(data) < LIVE_MAX_MESSAGE_BYTES / 2
+    with pytest.raises(MessageError):
+        parse_message(data)
+    with pytest.raises(MessageError):
+        parse_message(data.encode("utf-8"))
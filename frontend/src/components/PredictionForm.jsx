@@ -1,9 +1,13 @@
-import React from 'react';
+import React, { useEffect, useRef } from 'react';
 import { useForm } from 'react-hook-form';
-import { healthService } from '../services/api';
+import { healthService, liveService } from '../services/api';
 import { Activity, Heart, Moon, Dumbbell } from 'lucide-react';
 import toast from 'react-hot-toast';
 
+// Slider previews are sent at most this often, well under the server's
+// per-connection message cap; the latest values always go out last
+const PREVIEW_INTERVAL_MS = 100;
+
 const PredictionForm = ({ onPredict }) => {
     const { register, handleSubmit, watch, formState: { errors } } = useForm({
         defaultValues: {
@@ -16,7 +20,61 @@ const PredictionForm = ({ onPredict }) => {
 
     const values = watch();
 
+    // Live preview socket; until it is ready, or once it closes, the form falls back to HTTP
+    const socketRef = useRef(null);
+    const readyRef = useRef(false);
+    const pendingRef = useRef(null);
+    const timerRef = useRef(null);
+    const nextIdRef = useRef(0);
+
+    useEffect(() => {
+        socketRef.current = liveService.connect({
+            onMessage: (message) => {
+                if (message.type === 'ready') {
+                    readyRef.current = true;
+                } else if (message.type === 'prediction') {
+                    onPredict(message);
+                } else if (message.type === 'saved') {
+                    onPredict(message);
+                    toast.success('Prediction saved to your history.');
+                } else if (message.type === 'error' && String(message.id).startsWith('save')) {
+                    toast.error('Failed to save prediction. Please try again.');
+                }
+            },
+            onClose: () => {
+                readyRef.current = false;
+            },
+        });
+        return () => {
+            readyRef.current = false;
+            clearTimeout(timerRef.current);
+            socketRef.current.close();
+        };
+    }, [onPredict]);
+
+    useEffect(() => {
+        const flush = () => {
+            if (pendingRef.current && readyRef.current) {
+                socketRef.current.send(JSON.stringify({ type: 'preview', id: nextIdRef.current++, ...pendingRef.current }));
+                pendingRef.current = null;
+                timerRef.current = setTimeout(flush, PREVIEW_INTERVAL_MS);
+            } else {
+                timerRef.current = null;
+            }
+        };
+        const subscription = watch((data) => {
+            if (!readyRef.current) return;
+            pendingRef.current = data;
+            if (!timerRef.current) flush();
+        });
+        return () => subscription.unsubscribe();
+    }, [watch]);
+
     const onSubmit = async (data) => {
+        if (readyRef.current) {
+            socketRef.current.send(JSON.stringify({ type: 'save', id: `save-${nextIdRef.current++}`, ...data }));
+            return;
+        }
         try {
             const response = await healthService.predictRisk(data);
             onPredict(response.data);
@@ -15,24 +15,50 @@ import {
     BrainCircuit
 } from 'lucide-react';
 import { NavLink, useNavigate } from 'react-router-dom';
+import { LineChart, Line, XAxis, YAxis, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 import FuzzyVisualizer from '../components/FuzzyVisualizer';
 
+const TREND_PERIODS = [
+    { value: 'day', label: 'Daily' },
+    { value: 'week', label: 'Weekly' },
+    { value: 'month', label: 'Monthly' },
+];
+
 const HistoryPage = () => {
     const { user, logout } = useAuth();
     const navigate = useNavigate();
     const [history, setHistory] = useState([]);
     const [loading, setLoading] = useState(true);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [isSidebarOpen, setSidebarOpen] = useState(window.innerWidth >= 768);
     const [selectedRecord, setSelectedRecord] = useState(null);
+    const [trendPeriod, setTrendPeriod] = useState('day');
+    const [trends, setTrends] = useState([]);
 
     useEffect(() => {
         fetchHistory();
     }, []);
 
-    const fetchHistory = async () => {
+    useEffect(() => {
+        fetchTrends(trendPeriod);
+    }, [trendPeriod]);
+
+    const fetchTrends = async (period) => {
+        try {
+            // Aggregated per period on the server, so this stays small however long the history is
+            const response = await healthService.getTrends({ period });
+            setTrends(response.data.buckets);
+        } catch (error) {
+            console.error('Failed to fetch trends', error);
+        }
+    };
+
+    const fetchHistory = async (cursor = null) => {
         try {
-            const response = await healthService.getHistory();
-            setHistory(response.data);
+            const response = await healthService.getHistory(cursor ? { cursor } : undefined);
+            setHistory((prev) => (cursor ? [...prev, ...response.data] : response.data));
+            setNextCursor(response.headers['x-next-cursor'] || null);
         } catch (error) {
             console.error('Failed to fetch history', error);
         } finally {
@@ -40,6 +66,12 @@ const HistoryPage = () => {
         }
     };
 
+    const loadMore = async () => {
+        setLoadingMore(true);
+        await fetchHistory(nextCursor);
+        setLoadingMore(false);
+    };
+
     const handleLogout = () => {
         logout();
         navigate('/login');
@@ -153,6 +185,40 @@ const HistoryPage = () => {
                                 </button>
                             </div>
                         ) : (
+                            <>
+                            <div className="bg-white shadow rounded-xl border border-gray-100 p-6 mb-8">
+                                <div className="flex items-center justify-between mb-4">
+                                    <h3 className="text-lg font-semibold text-gray-800">Risk Trend</h3>
+                                    <div className="flex space-x-1 bg-gray-100 rounded-lg p-1">
+                                        {TREND_PERIODS.map(({ value, label }) => (
+                                            <button
+                                                key={value}
+                                                onClick={() => setTrendPeriod(value)}
+                                                className={`px-3 py-1 text-sm rounded-md transition-colors ${trendPeriod === value ? 'bg-white text-blue-600 shadow-sm font-medium' : 'text-gray-500 hover:text-gray-700'}`}
+                                            >
+                                                {label}
+                                            </button>
+                                        ))}
+                                    </div>
+                                </div>
+                                {trends.length === 0 ? (
+                                    <p className="text-sm text-gray-500">No predictions in this range.</p>
+                                ) : (
+                                    <div className="h-64">
+                                        <ResponsiveContainer width="100%" height="100%">
+                                            <LineChart data={trends}>
+                                                <XAxis dataKey="start" tick={{ fontSize: 12 }} />
+                                                <YAxis domain={[0, 100]} tick={{ fontSize: 12 }} />
+                                                <Tooltip />
+                                                <Legend />
+                                                <Line type="monotone" dataKey="max_risk_score" name="Max" stroke="#ef4444" dot={false} />
+                                                <Line type="monotone" dataKey="average_risk_score" name="Average" stroke="#2563eb" strokeWidth={2} />
+                                                <Line type="monotone" dataKey="min_risk_score" name="Min" stroke="#22c55e" dot={false} />
+                                            </LineChart>
+                                        </ResponsiveContainer>
+                                    </div>
+                                )}
+                            </div>
                             <div className="bg-white shadow rounded-xl border border-gray-100 overflow-x-auto">
                                 <table className="min-w-full divide-y divide-gray-200">
                                     <thead className="bg-gray-50">
@@ -201,7 +267,19 @@ const HistoryPage = () => {
                                         ))}
                                     </tbody>
                                 </table>
+                                {nextCursor && (
+                                    <div className="flex justify-center p-4 border-t border-gray-100">
+                                        <button
+                                            onClick={loadMore}
+                                            disabled={loadingMore}
+                                            className="px-4 py-2 text-sm font-medium text-blue-600 bg-blue-50 rounded-lg border border-blue-100 hover:bg-blue-100 disabled:opacity-50"
+                                        >
+                                            {loadingMore ? 'Loading...' : 'Load more'}
+                                        </button>
+                                    </div>
+                                )}
                             </div>
+                            </>
                         )}
                     </div>
                 </main>
@@ -20,7 +20,30 @@ export const authService = {
 
 export const healthService = {
     predictRisk: (data) => api.post('/predict-risk', data),
-    getHistory: () => api.get('/history'),
+    getHistory: (params) => api.get('/history', { params }),
+    // params: period ('day' | 'week' | 'month'), buckets
+    getTrends: (params) => api.get('/trends', { params }),
+};
+
+export const fuzzyService = {
+    // params: bmi, heart_rate, sleep_hours, exercise_level, x, y[, resolution]
+    getRiskSurface: (params) => api.get('/fuzzy/surface', { params }),
+    explain: (params) => api.get('/fuzzy/explain', { params }),
+};
+
+export const liveService = {
+    // Slider previews over one WebSocket: authenticate once, then send
+    // { type: 'preview' | 'save', id, ...inputs }. Only the latest pending
+    // preview is scored and nothing is stored until a save.
+    connect: ({ onMessage, onClose }) => {
+        const url = new URL(`${api.defaults.baseURL.replace(/\/$/, '')}/predict-risk/live`, window.location.href);
+        url.protocol = url.protocol === 'https:' ? 'wss:' : 'ws:';
+        const socket = new WebSocket(url);
+        socket.onopen = () => socket.send(JSON.stringify({ type: 'auth', token: localStorage.getItem('token') }));
+        socket.onmessage = (event) => onMessage(JSON.parse(event.data));
+        socket.onclose = (event) => onClose?.(event);
+        return socket;
+    },
 };
 
 export const adminService = {